@@ -0,0 +1,280 @@
+"""Состояние врагов и пуль комнаты в массивах NumPy.
+
+Позиции, скорости, границы патрулирования, таймеры стрельбы и время жизни
+пуль хранятся в массивах и обновляются несколькими векторными операциями
+за тик. Спрайты получают позиции только перед отрисовкой (sync_sprites)
+и, точечно, перед точной проверкой столкновений.
+
+Поведение повторяет Room.update_enemies / Room.update_bullets.
+"""
+import numpy as np
+
+import arcade
+
+START_CAPACITY = 64
+
+
+class ArrayEngine:
+    def __init__(self, room):
+        self.room = room
+        self.rebuild()
+
+    def rebuild(self):
+        """Перечитывает состояние из спрайтов room.enemies и room.bullets"""
+        enemies = list(self.room.enemies)
+
+        self.enemy_x = np.array([e.center_x for e in enemies], dtype=np.float64)
+        self.enemy_y = np.array([e.center_y for e in enemies], dtype=np.float64)
+        self.enemy_vx = np.array([e.change_x for e in enemies], dtype=np.float64)
+        self.enemy_vy = np.array([e.change_y for e in enemies], dtype=np.float64)
+        self.min_x = np.array([e.min_x for e in enemies], dtype=np.float64)
+        self.max_x = np.array([e.max_x for e in enemies], dtype=np.float64)
+        self.min_y = np.array([e.min_y for e in enemies], dtype=np.float64)
+        self.max_y = np.array([e.max_y for e in enemies], dtype=np.float64)
+        self.is_shooter = np.array([e.is_shooter for e in enemies], dtype=bool)
+        self.shoot_timer = np.array([e.shoot_timer for e in enemies], dtype=np.float64)
+        self.shoot_cooldown = np.array([e.shoot_cooldown for e in enemies], dtype=np.float64)
+        self.shoot_range = np.array([e.shoot_range for e in enemies], dtype=np.float64)
+        self.bullet_speed = np.array([e.bullet_speed for e in enemies], dtype=np.float64)
+
+        bullets = list(self.room.bullets)
+        self.bullet_count = len(bullets)
+        capacity = max(START_CAPACITY, self.bullet_count)
+        self.bullet_x = np.zeros(capacity)
+        self.bullet_y = np.zeros(capacity)
+        self.bullet_vx = np.zeros(capacity)
+        self.bullet_vy = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity)
+        for i, bullet in enumerate(bullets):
+            self.bullet_x[i] = bullet.center_x
+            self.bullet_y[i] = bullet.center_y
+            self.bullet_vx[i] = bullet.change_x
+            self.bullet_vy[i] = bullet.change_y
+            self.lifetime[i] = bullet.lifetime
+
+    def _grow_bullets(self, needed):
+        capacity = len(self.bullet_x)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("bullet_x", "bullet_y", "bullet_vx", "bullet_vy", "lifetime"):
+            old = getattr(self, name)
+            new = np.zeros(capacity)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def update_enemies(self, delta_time, player_x, player_y):
+        room = self.room
+        x, y = self.enemy_x, self.enemy_y
+        vx, vy = self.enemy_vx, self.enemy_vy
+
+        x += vx
+        y += vy
+
+        # Разворот на границах патрулирования
+        vx[(vx != 0) & ((x >= self.max_x) | (x <= self.min_x))] *= -1
+        vy[(vy != 0) & ((y >= self.max_y) | (y <= self.min_y))] *= -1
+
+        # Враг не выходит за пределы комнаты
+        np.clip(x, room.left + 30, room.right - 30, out=x)
+        np.clip(y, room.bottom + 30, room.top - 30, out=y)
+
+        # Стрельба
+        self.shoot_timer[self.is_shooter] += delta_time
+        dx = player_x - x
+        dy = player_y - y
+        distance = np.sqrt(dx * dx + dy * dy)
+        fire = self.is_shooter & (distance <= self.shoot_range) & (self.shoot_timer >= self.shoot_cooldown)
+        if not fire.any():
+            return
+
+        self.shoot_timer[fire] = 0
+        self.spawn_bullets(x[fire], y[fire], dx[fire], dy[fire], distance[fire], self.bullet_speed[fire])
+
+    def spawn_bullets(self, x, y, dx, dy, distance, speed):
+        count = len(x)
+        start = self.bullet_count
+        end = start + count
+        self._grow_bullets(end)
+
+        # Как в Bullet.fire: при нулевой дистанции пуля стоит на месте
+        safe = np.where(distance > 0, distance, 1)
+        moving = distance > 0
+        self.bullet_x[start:end] = x
+        self.bullet_y[start:end] = y
+        self.bullet_vx[start:end] = np.where(moving, dx / safe * speed, 0)
+        self.bullet_vy[start:end] = np.where(moving, dy / safe * speed, 0)
+        self.lifetime[start:end] = 180
+        self.bullet_count = end
+
+        # Спрайты нужны только для отрисовки, берём их из пула комнаты
+        pool = self.room.bullet_pool
+        for _ in range(count):
+            self.room.bullets.append(pool.take())
+
+    def update_bullets(self):
+        room = self.room
+        n = self.bullet_count
+        if n == 0:
+            return
+
+        x = self.bullet_x[:n]
+        y = self.bullet_y[:n]
+        # Bullet.update сдвигает пулю дважды: в Sprite.update и вручную
+        x += self.bullet_vx[:n]
+        x += self.bullet_vx[:n]
+        y += self.bullet_vy[:n]
+        y += self.bullet_vy[:n]
+        self.lifetime[:n] -= 1
+
+        dead = ((self.lifetime[:n] <= 0) |
+                (x < room.left - 50) | (x > room.right + 50) |
+                (y < room.bottom - 50) | (y > room.top + 50))
+        if dead.any():
+            self._keep_bullets(~dead)
+
+    def _keep_bullets(self, alive):
+        """Сдвигает живые пули в начало массивов, лишние спрайты с конца уходят в пул"""
+        n = self.bullet_count
+        count = int(alive.sum())
+        for name in ("bullet_x", "bullet_y", "bullet_vx", "bullet_vy", "lifetime"):
+            array = getattr(self, name)
+            array[:count] = array[:n][alive]
+        self.bullet_count = count
+
+        # Спрайты взаимозаменяемы, позиции им раздаёт sync_sprites
+        bullets = self.room.bullets
+        pool = self.room.bullet_pool
+        for _ in range(n - count):
+            pool.free.append(bullets.pop())
+
+    def remove_bullets(self, sprites):
+        """Удаляет пули, которым соответствуют спрайты (попадания в игрока).
+
+        Номера всех спрайтов берутся до удаления: удаление сдвигает пули
+        и спрайты, и спрайт второго попадания может уйти в пул.
+        """
+        bullets = self.room.bullets
+        alive = np.ones(self.bullet_count, dtype=bool)
+        for sprite in sprites:
+            alive[bullets.index(sprite)] = False
+        self._keep_bullets(alive)
+
+    def save_state(self):
+        """Копии изменчивых массивов: позиции, скорости, таймеры и живые пули"""
+        n = self.bullet_count
+        return (self.enemy_x.copy(), self.enemy_y.copy(), self.enemy_vx.copy(), self.enemy_vy.copy(),
+                self.shoot_timer.copy(),
+                self.bullet_x[:n].copy(), self.bullet_y[:n].copy(), self.bullet_vx[:n].copy(),
+                self.bullet_vy[:n].copy(), self.lifetime[:n].copy())
+
+    def restore_state(self, state):
+        """Копирует снимок в те же массивы, число спрайтов пуль подгоняется через пул"""
+        (self.enemy_x[:], self.enemy_y[:], self.enemy_vx[:], self.enemy_vy[:],
+         self.shoot_timer[:]) = state[:5]
+
+        count = len(state[5])
+        self._grow_bullets(count)
+        for name, values in zip(("bullet_x", "bullet_y", "bullet_vx", "bullet_vy", "lifetime"), state[5:]):
+            getattr(self, name)[:count] = values
+        self.bullet_count = count
+
+        room = self.room
+        pool = room.bullet_pool
+        while len(room.bullets) > count:
+            pool.free.append(room.bullets.pop())
+        while len(room.bullets) < count:
+            room.bullets.append(pool.take())
+
+    def _hits(self, player, sprites, x, y, half_w, half_h):
+        """Грубый отбор по AABB в массивах, затем точная проверка arcade"""
+        if len(x) == 0:
+            return []
+        near = np.nonzero((np.abs(x - player.center_x) < player.width / 2 + half_w) &
+                          (np.abs(y - player.center_y) < player.height / 2 + half_h))[0]
+        hits = []
+        for i in near.tolist():
+            sprite = sprites[i]
+            sprite.position = (x[i], y[i])
+            if arcade.check_for_collision(player, sprite):
+                hits.append(sprite)
+        return hits
+
+    def enemies_hitting(self, player):
+        enemies = self.room.enemies
+        if len(enemies) == 0:
+            return []
+        return self._hits(player, enemies, self.enemy_x, self.enemy_y,
+                          enemies[0].width / 2, enemies[0].height / 2)
+
+    def bullets_hitting(self, player):
+        n = self.bullet_count
+        if n == 0:
+            return []
+        bullets = self.room.bullets
+        return self._hits(player, bullets, self.bullet_x[:n], self.bullet_y[:n],
+                          bullets[0].width / 2, bullets[0].height / 2)
+
+    def sync_sprites(self):
+        """Переносит позиции из массивов в спрайты перед отрисовкой"""
+        for sprite, x, y in zip(self.room.enemies, self.enemy_x.tolist(), self.enemy_y.tolist()):
+            sprite.position = (x, y)
+        n = self.bullet_count
+        for sprite, x, y in zip(self.room.bullets, self.bullet_x[:n].tolist(), self.bullet_y[:n].tolist()):
+            sprite.position = (x, y)
+
+
+def _bullet_state(room):
+    """Пули комнаты в порядке, не зависящем от порядка спрайтов"""
+    engine = room.engine
+    if engine:
+        n = engine.bullet_count
+        rows = zip(engine.bullet_x[:n].tolist(), engine.bullet_y[:n].tolist(),
+                   engine.bullet_vx[:n].tolist(), engine.bullet_vy[:n].tolist(), engine.lifetime[:n].tolist())
+    else:
+        rows = ((b.center_x, b.center_y, b.change_x, b.change_y, b.lifetime) for b in room.bullets)
+    return sorted(tuple(round(value, 6) for value in row) for row in rows)
+
+
+def _check_against_sprites(ticks=600):
+    """Гоняет одну раскладку в спрайтах и в массивах и сверяет их по тикам"""
+    from main import Player, Room
+
+    def pair(seed):
+        rooms = [Room(x=450, y=2700, width=600, height=5000, seed=seed) for _ in range(2)]
+        return rooms[0], rooms[1]
+
+    # Враги и стрельба
+    sprites, arrays = pair(11)
+    arrays.engine = ArrayEngine(arrays)
+    target = next(e for e in sprites.enemies if e.is_shooter).position
+    for tick in range(ticks):
+        for room in (sprites, arrays):
+            room.update_enemies(1 / 60, *target)
+            room.update_bullets()
+        assert _bullet_state(sprites) == _bullet_state(arrays), f"пули разошлись на тике {tick}"
+    arrays.engine.sync_sprites()
+    assert [e.position for e in sprites.enemies] == [e.position for e in arrays.enemies]
+
+    # Две пули попадают в игрока за один тик, вторая - последний спрайт
+    player = Player()
+    player.position = (450, 400)
+    sprites, arrays = pair(12)
+    for room in (sprites, arrays):
+        room.bullet_pool.clear()
+        for i in range(5):
+            x = player.center_x if i in (1, 4) else player.center_x + 200 + 50 * i
+            room.bullet_pool.spawn(x, player.center_y, x, player.center_y)
+    arrays.engine = ArrayEngine(arrays)
+    for room in (sprites, arrays):
+        hits = room.bullets_hitting(player)
+        assert len(hits) == 2, hits
+        room.remove_bullets(hits)
+    assert _bullet_state(sprites) == _bullet_state(arrays)
+    assert len(arrays.bullets) == arrays.engine.bullet_count == 3
+
+
+if __name__ == "__main__":
+    _check_against_sprites()
+    print("array engine matches the sprite path")
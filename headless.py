@@ -0,0 +1,208 @@
+"""Прогон симуляции MyGame без окна с фиксированным шагом.
+
+Комнаты, игрок и физика строятся тем же MyGame.setup, что и в игре,
+а вместо окна и камеры подставляются заглушки без OpenGL.
+
+Пример:
+    python headless.py --ticks 6000 --seed 1 --script "0:D,40:SPACE,41:-SPACE"
+    python headless.py --ticks 6000 --seed 1 --record run.eovr
+    python headless.py --replay run.eovr        # без отрисовки и пауз, на полной скорости
+"""
+import argparse
+import random
+import time
+
+import arcade
+
+from main import FIXED_STEP, MyGame, SCREEN_WIDTH, SCREEN_HEIGHT
+from replay import Replay
+
+FIXED_DELTA = FIXED_STEP
+
+# Сценарий по умолчанию: идём вправо и иногда прыгаем
+DEFAULT_SCRIPT = "0:D,30:SPACE,31:-SPACE,90:SPACE,91:-SPACE"
+
+
+class HeadlessWindow:
+    """Заглушка окна: хранит размеры и последний показанный View"""
+
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        self.width = width
+        self.height = height
+        self.current_view = None
+
+    def show_view(self, view):
+        self.current_view = view
+
+
+class HeadlessCamera:
+    """Камера без OpenGL: только то, что читает center_camera_to_player"""
+
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        self.viewport_width = width
+        self.viewport_height = height
+        self.position = (width / 2, height / 2)
+
+
+class HeadlessGame(MyGame):
+    def __init__(self):
+        super().__init__(window=HeadlessWindow())
+        self.outcome = None
+        self.death_reason = None
+
+    def setup(self):
+        super().setup()
+        self.outcome = None
+        self.death_reason = None
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        if not self.game_over:
+            self.outcome = None
+            self.death_reason = None
+
+    def pack_textures(self):
+        pass  # Без OpenGL атласа нет
+
+    def create_camera(self):
+        return HeadlessCamera()
+
+    def lose(self, reason):
+        self.player.die()
+        self.game_over = True
+        self.outcome = "lose"
+        self.death_reason = reason
+
+    def win(self):
+        self.game_over = True
+        self.outcome = "win"
+
+    def step(self, delta_time=FIXED_DELTA):
+        self.on_update(delta_time)
+        self.profiler.end_frame()
+
+
+def parse_script(text):
+    """Разбирает сценарий вида "0:D,40:SPACE,41:-SPACE".
+
+    Возвращает словарь {тик: [(клавиша, нажата), ...]}.
+    Минус перед именем клавиши означает отпускание.
+    """
+    script = {}
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        tick, name = item.split(":")
+        pressed = not name.startswith("-")
+        key = getattr(arcade.key, name.lstrip("-").upper())
+        script.setdefault(int(tick), []).append((key, pressed))
+    return script
+
+
+def run(game, ticks, script=None, delta_time=FIXED_DELTA, stop_on_game_over=True):
+    """Делает до ticks шагов симуляции, подавая события из script"""
+    script = script or {}
+
+    start = time.perf_counter()
+    for tick in range(game.tick, game.tick + ticks):
+        for key, pressed in script.get(tick, ()):
+            if pressed:
+                game.on_key_press(key, 0)
+            else:
+                game.on_key_release(key, 0)
+
+        game.step(delta_time)
+
+        if stop_on_game_over and game.game_over:
+            break
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ticks": game.tick,
+        "elapsed": elapsed,
+        "ticks_per_second": game.tick / elapsed if elapsed > 0 else float("inf"),
+        "outcome": game.outcome,
+        "death_reason": game.death_reason,
+    }
+
+
+def run_replay(game, replay):
+    """Прогоняет запись до её последнего тика так быстро, как получится"""
+    start = time.perf_counter()
+    while game.tick < replay.end_tick:
+        tick = game.tick
+        game.step()
+        if game.game_over and game.tick == tick:
+            break  # Игра окончена, а перезапуска в записи нет
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ticks": game.tick,
+        "elapsed": elapsed,
+        "ticks_per_second": game.tick / elapsed if elapsed > 0 else float("inf"),
+        "outcome": game.outcome,
+        "death_reason": game.death_reason,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless simulation of Echo of the Void")
+    parser.add_argument("--ticks", type=int, default=3600)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--script", default=DEFAULT_SCRIPT)
+    parser.add_argument("--keep-going", action="store_true",
+                        help="не останавливаться после смерти или победы")
+    parser.add_argument("--arrays", action="store_true",
+                        help="враги и пули в массивах NumPy (array_engine.py)")
+    parser.add_argument("--load-level", help="взять комнаты из файла раскладки")
+    parser.add_argument("--save-level", help="сохранить раскладку комнат в файл")
+    parser.add_argument("--profile", action="store_true", help="вывести время фаз обновления")
+    parser.add_argument("--telemetry", help="писать каждый тик в файл .jsonl или .csv")
+    parser.add_argument("--record", help="записать ввод и seed в файл для повтора")
+    parser.add_argument("--replay", help="прогнать запись (--ticks и --script не нужны)")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    game = HeadlessGame()
+    game.array_engine = args.arrays
+    replay = None
+    if args.replay:
+        replay = Replay.load(args.replay)
+        game.start_replay(replay)
+    if args.load_level:
+        game.load_level(args.load_level)
+    if args.record:
+        game.start_recording(args.record)
+    game.setup()
+    if args.save_level:
+        game.save_level(args.save_level)
+    if args.telemetry:
+        game.start_telemetry(args.telemetry)
+    try:
+        if replay:
+            result = run_replay(game, replay)
+        else:
+            result = run(game, args.ticks, parse_script(args.script),
+                         stop_on_game_over=not args.keep_going)
+    finally:
+        game.stop_recording()
+        game.stop_telemetry()
+
+    print(f"ticks: {result['ticks']}")
+    print(f"elapsed: {result['elapsed']:.3f} s")
+    print(f"ticks/s: {result['ticks_per_second']:.0f}")
+    print(f"outcome: {result['outcome'] or 'none'}")
+    if result["death_reason"]:
+        print(f"death: {result['death_reason']}")
+    if replay:
+        print(f"replay matches: {'yes' if replay.matches(game.tick, game.player.position) else 'no'}")
+    if args.profile:
+        print()
+        print("\n".join(game.profiler.report()))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,239 @@ import arcade
 from pyglet.graphics import Batch
 import random
 import math
+import struct
+import queue
+import threading
+import time
+import argparse
+from array import array
+
+from physics import PlatformerPhysics
+from reachability import PlatformGraph
+from replay import InputRecorder, Replay
+from profiler import FrameProfiler
+from telemetry import TelemetryWriter
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 WORLD_WIDTH = 8000
 WORLD_HEIGHT = 6000
+DRAW_CHUNK_HEIGHT = 600  # Высота полосы статики комнаты, которая рисуется целиком
+ROOM_LOAD_DISTANCE = 1200  # Ближе этого к игроку комната строится
+ROOM_UNLOAD_DISTANCE = 2000  # Дальше этого - разбирается
+ROOM_PREFETCH_DISTANCE = 2400  # Ближе этого раскладка комнаты генерируется в фоне
+ROOM_EVICT_DISTANCE = 3200  # Дальше этого раскладка уходит из LAYOUT_CACHE
+FIXED_STEP = 1 / 60  # Шаг симуляции: скорости врагов, пуль и игрока заданы на него
+NPC_RANGE = 100  # С этого расстояния по каждой оси с NPC можно заговорить
+MAX_CATCH_UP_STEPS = 5  # Больше шагов за кадр не делаем, игра замедляется вместо спирали
+FAR_AWAY = (math.inf, math.inf)  # Цель, до которой не дострелит ни один враг
+
+# Картинки, которые игра грузит при setup, их можно декодировать заранее
+GAME_TEXTURES = (
+    "images/backgrounds/background.png",
+    "images/backgrounds/wall.png",
+    "images/backgrounds/floor.png",
+    "images/backgrounds/ground.png",
+    "images/backgrounds/island.png",
+    "images/npc/player_good_npc.png",
+    ":resources:images/tiles/mushroomRed.png",
+)
+
+
+class TextureRegistry:
+    """Общий реестр текстур игры.
+
+    Каждая картинка декодируется, а каждая сгенерированная текстура создаётся
+    один раз, спрайты получают ссылки на одни и те же объекты. pack() заранее
+    кладёт всё в атлас, из которого рисуют все SpriteList.
+    """
+
+    def __init__(self):
+        self.textures = {}
+
+    def load(self, path):
+        texture = self.textures.get(path)
+        if texture is None:
+            texture = arcade.texture.default_texture_cache.load_or_get_texture(path)
+            self.textures[path] = texture
+        return texture
+
+    def circle(self, diameter, color):
+        key = ("circle", diameter, tuple(color))
+        texture = self.textures.get(key)
+        if texture is None:
+            texture = arcade.make_circle_texture(diameter, color)
+            self.textures[key] = texture
+        return texture
+
+    def soft_square(self, size, color):
+        key = ("soft_square", size, tuple(color))
+        texture = self.textures.get(key)
+        if texture is None:
+            texture = arcade.make_soft_square_texture(size, color)
+            self.textures[key] = texture
+        return texture
+
+    def warm_up(self):
+        """Готовит все текстуры игры (без OpenGL, можно из фонового потока)"""
+        for path in GAME_TEXTURES:
+            self.load(path)
+        self.circle(10, arcade.color.YELLOW)
+        self.soft_square(40, arcade.color.ORANGE)
+        self.soft_square(40, arcade.color.RED)
+
+    def pack(self, atlas):
+        """Кладёт все известные текстуры в атлас, чтобы он не рос посреди игры"""
+        for texture in list(self.textures.values()):
+            if not atlas.has_texture(texture):
+                atlas.add(texture)
+
+
+TEXTURES = TextureRegistry()
+
+
+def rects_intersect(a, b):
+    """Пересекаются ли прямоугольники (left, right, bottom, top)"""
+    return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+
+def merge_tiles(sprites):
+    """Склеивает плитки, стоящие вплотную, в прямоугольники (left, right, bottom, top).
+
+    Соседство определяется по раскладке плиток (центр и размер), а границы
+    результата - по хитбоксам, как их видит физика.
+    """
+    def layout(sprite):
+        return (sprite.center_x - sprite.width / 2, sprite.center_x + sprite.width / 2,
+                sprite.center_y - sprite.height / 2, sprite.center_y + sprite.height / 2)
+
+    def merge(items, key, start, end):
+        groups = {}
+        for item in items:
+            groups.setdefault(key(item[0]), []).append(item)
+
+        merged = []
+        for group in groups.values():
+            group.sort(key=lambda item: item[0][start])
+            current = group[0]
+            for item in group[1:]:
+                if abs(item[0][start] - current[0][end]) < 0.5:
+                    current = (
+                        tuple(min(a, b) if i % 2 == 0 else max(a, b)
+                              for i, (a, b) in enumerate(zip(current[0], item[0]))),
+                        tuple(min(a, b) if i % 2 == 0 else max(a, b)
+                              for i, (a, b) in enumerate(zip(current[1], item[1]))),
+                    )
+                else:
+                    merged.append(current)
+                    current = item
+            merged.append(current)
+        return merged
+
+    items = [(layout(sprite), (sprite.left, sprite.right, sprite.bottom, sprite.top))
+             for sprite in sprites]
+    # Сначала столбцы плиток, потом ряды
+    items = merge(items, lambda rect: (round(rect[0]), round(rect[1])), 2, 3)
+    items = merge(items, lambda rect: (round(rect[2]), round(rect[3])), 0, 1)
+    return [hit_rect for _, hit_rect in items]
+
+
+class SpatialGrid:
+    """Равномерная сетка по миру: объект лежит в ячейке своего центра.
+
+    Запрос возвращает объекты из ячейки точки и соседних, поэтому
+    cell_size должен быть не меньше суммы полуразмеров проверяемых объектов.
+    cell_height задаёт неквадратные ячейки (по умолчанию равна cell_size).
+    """
+
+    def __init__(self, cell_size=128, cell_height=None):
+        self.cell_size = cell_size
+        self.cell_height = cell_height or cell_size
+        self.cells = {}  # (cx, cy) -> {объект: None}, dict хранит порядок вставки
+        self.object_cells = {}
+
+    def cell_of(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_height)
+
+    def insert(self, obj, x, y):
+        cell = self.cell_of(x, y)
+        self.object_cells[obj] = cell
+        self.cells.setdefault(cell, {})[obj] = None
+
+    def move(self, obj, x, y):
+        cell = self.cell_of(x, y)
+        old_cell = self.object_cells.get(obj)
+        if cell == old_cell:
+            return
+        if old_cell is not None:
+            self._discard(obj, old_cell)
+        self.object_cells[obj] = cell
+        self.cells.setdefault(cell, {})[obj] = None
+
+    def remove(self, obj):
+        cell = self.object_cells.pop(obj, None)
+        if cell is not None:
+            self._discard(obj, cell)
+
+    def _discard(self, obj, cell):
+        bucket = self.cells[cell]
+        del bucket[obj]
+        if not bucket:
+            del self.cells[cell]
+
+    def query(self, x, y, radius=1):
+        """Объекты в ячейках на расстоянии radius ячеек от точки"""
+        cx, cy = self.cell_of(x, y)
+        found = []
+        for i in range(cx - radius, cx + radius + 1):
+            for j in range(cy - radius, cy + radius + 1):
+                bucket = self.cells.get((i, j))
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+    def clear(self):
+        self.cells.clear()
+        self.object_cells.clear()
+
+
+class BackgroundLayer:
+    """Повторяющийся фон в одном SpriteList: один вызов отрисовки за кадр.
+
+    parallax < 1 заставляет фон двигаться медленнее камеры.
+    """
+
+    def __init__(self, texture, columns=10, rows=10, parallax=1.0):
+        self.parallax = parallax
+        self.camera = None
+        self.tiles = arcade.SpriteList()
+        for i in range(rows):
+            for j in range(columns):
+                tile = arcade.Sprite(texture)
+                tile.width = SCREEN_WIDTH
+                tile.height = SCREEN_HEIGHT
+                tile.center_x = SCREEN_WIDTH * j
+                tile.center_y = SCREEN_HEIGHT * i
+                self.tiles.append(tile)
+
+    def draw(self, camera):
+        if self.parallax == 1:
+            self.tiles.draw()
+            return
+
+        if self.camera is None:
+            self.camera = arcade.Camera2D()
+        cam_x, cam_y = camera.position
+        self.camera.position = (cam_x * self.parallax, cam_y * self.parallax)
+        self.camera.use()
+        self.tiles.draw()
+        camera.use()
 
 
 class Platform(arcade.Sprite):
     def __init__(self, x, y, width=100, height=20):
 
-        super().__init__("images/backgrounds/island.png", scale=1.0)
+        super().__init__(TEXTURES.load("images/backgrounds/island.png"), scale=1.0)
         self.center_x = x
         self.center_y = y
         self.width = width
@@ -21,12 +243,19 @@ class Platform(arcade.Sprite):
         self.change_y = 0
 
 
-class Bullet(arcade.Sprite):
+class Bullet(arcade.BasicSprite):
+    """Пуля на лёгком BasicSprite: всё состояние в слотах, без словаря атрибутов"""
+
+    __slots__ = ("change_x", "change_y", "speed", "lifetime")
+
     def __init__(self, x, y, target_x, target_y, speed=5):
 
-        texture = arcade.make_circle_texture(10, arcade.color.YELLOW)
-        super().__init__(texture, scale=1.0)
+        super().__init__(TEXTURES.circle(10, arcade.color.YELLOW), scale=1.0)
 
+        self.fire(x, y, target_x, target_y, speed)
+
+    def fire(self, x, y, target_x, target_y, speed=5):
+        """Запускает пулю заново, используется и пулом пуль"""
         self.center_x = x
         self.center_y = y
         self.speed = speed
@@ -48,39 +277,90 @@ class Bullet(arcade.Sprite):
 
     def update(self):
         """Обновляет позицию пули и уменьшает время жизни"""
-        super().update()
-
-        self.center_x += self.change_x
-        self.center_y += self.change_y
+        # Пуля сдвигается дважды за тик: так было с Sprite.update и ручным сдвигом
+        x, y = self._position
+        x += self.change_x
+        y += self.change_y
+        self.position = (x + self.change_x, y + self.change_y)
         self.lifetime -= 1
         return self.lifetime <= 0
 
 
-class Enemy(arcade.Sprite):
-    def __init__(self, x, y, is_shooter=False):
+class BulletPool:
+    """Переиспользует спрайты пуль вместо создания новых на каждый выстрел"""
+
+    def __init__(self, bullets, grid=None):
+        self.bullets = bullets  # Активные пули, их рисует комната
+        self.grid = grid
+        self.free = []
+
+    def spawn(self, x, y, target_x, target_y, speed=5):
+        if self.free:
+            bullet = self.free.pop()
+            bullet.fire(x, y, target_x, target_y, speed)
+        else:
+            bullet = Bullet(x, y, target_x, target_y, speed)
+        self.bullets.append(bullet)
+        if self.grid is not None:
+            self.grid.insert(bullet, x, y)
+        return bullet
+
+    def take(self):
+        """Свободный спрайт пули или новый, без выстрела: позицию задаст вызывающий"""
+        if self.free:
+            return self.free.pop()
+        return Bullet(0, 0, 0, 0)
+
+    def release(self, bullet):
+        bullet.remove_from_sprite_lists()
+        if self.grid is not None:
+            self.grid.remove(bullet)
+        self.free.append(bullet)
+
+    def clear(self):
+        while len(self.bullets) > 0:
+            self.free.append(self.bullets.pop())
+        if self.grid is not None:
+            self.grid.clear()
+
+
+class Enemy(arcade.BasicSprite):
+    # Общие для всех врагов параметры
+    speed = 1.5
+    shoot_cooldown = 2.0  # Время между выстрелами в секундах
+    bullet_speed = 4
+    shoot_range = 400  # Максимальная дистанция стрельбы
+
+    # Состояние врага в слотах лёгкого BasicSprite: без словаря атрибутов
+    __slots__ = ("change_x", "change_y", "direction", "patrol_distance",
+                 "start_x", "max_x", "min_x", "start_y", "max_y", "min_y",
+                 "is_shooter", "shoot_timer", "is_on_wall", "is_on_ceiling")
+
+    def __init__(self, x, y, is_shooter=False, shoot_timer=None):
         # Создаем врага
         color = arcade.color.ORANGE if is_shooter else arcade.color.RED
-        texture = arcade.make_soft_square_texture(40, color)
-        super().__init__(texture, scale=0.8)
+        super().__init__(TEXTURES.soft_square(40, color), scale=0.8)
 
         self.center_x = x
         self.center_y = y
-        self.speed = 1.5
         self.direction = 1  # 1 для движения вправо, -1 для движения влево
         self.change_x = self.speed * self.direction
+        self.change_y = 0
 
-        # Для патрулирования (движение вперед-назад)
+        # Для патрулирования (движение вперед-назад), по y - только у стенных врагов
         self.patrol_distance = 100
         self.start_x = x
         self.max_x = x + self.patrol_distance
         self.min_x = x - self.patrol_distance
+        self.start_y = y
+        self.max_y = y + self.patrol_distance
+        self.min_y = y - self.patrol_distance
 
         # Для стрельбы
         self.is_shooter = is_shooter
-        self.shoot_timer = random.uniform(0, 2)  # Случайное начальное значение таймера
-        self.shoot_cooldown = 2.0  # Время между выстрелами в секундах
-        self.bullet_speed = 4
-        self.shoot_range = 400  # Максимальная дистанция стрельбы
+        if shoot_timer is None:
+            shoot_timer = random.uniform(0, 2)  # Случайное начальное значение таймера
+        self.shoot_timer = shoot_timer
 
         # Для врагов на стенах/потолке
         self.is_on_wall = False
@@ -115,8 +395,247 @@ class Enemy(arcade.Sprite):
         return 1, 0  # По умолчанию стреляем вправо
 
 
+class RoomLayout:
+    """Описание сгенерированной комнаты без спрайтов: его можно кэшировать и сохранять"""
+
+    # Параметры основной лестницы платформ (playtest.py перебирает их)
+    PLATFORM_STEP_Y = 120  # Расстояние между платформами по вертикали
+    PLATFORM_MAX_X_OFFSET = 150  # Максимальное смещение по X относительно предыдущей платформы
+
+    def __init__(self, x, y, width, height, wall_thickness, seed, platforms=None, enemies=None):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.wall_thickness = wall_thickness
+        self.seed = seed
+        self.platforms = platforms if platforms is not None else []
+        self.enemies = enemies if enemies is not None else []
+
+        # Границы комнаты, как в Room
+        self.left = x - width // 2
+        self.right = x + width // 2
+        self.bottom = y - height // 2
+        self.top = y + height // 2
+
+        # Граф прыжков между платформами, строится вместе с раскладкой: в игре это
+        # фоновый поток RoomStreamer или prepare, у файла уровня - load_layouts до setup
+        self.graph = None
+        if platforms is not None:
+            self.build_graph()
+
+    @classmethod
+    def generate(cls, x, y, width, height, wall_thickness, seed):
+        """Генерирует раскладку. Не трогает OpenGL, можно звать из фонового потока"""
+        layout = cls(x, y, width, height, wall_thickness, seed)
+        rng = random.Random(seed)
+        layout.generate_platforms_improved(rng)
+        layout.generate_enemies(rng)
+        layout.build_graph()
+        return layout
+
+    def build_graph(self):
+        self.graph = PlatformGraph(self.platforms, self.left, self.right, self.bottom)
+
+    def key(self):
+        return self.x, self.y, self.width, self.height, self.wall_thickness, self.seed
+
+    def generate_platforms_improved(self, rng):
+        platforms = self.platforms  # (x, y, ширина, высота)
+
+        # Параметры генерации
+        start_y = self.bottom + 100  # Начальная высота
+        end_y = self.top - 100  # Конечная высота
+        step_y = self.PLATFORM_STEP_Y
+        max_x_offset = self.PLATFORM_MAX_X_OFFSET
+
+        # Генерируем первую платформу в случайном месте внизу
+        first_x = rng.uniform(self.left + 100, self.right - 100)
+        first_y = start_y
+        platforms.append((first_x, first_y, 100, 20))
+
+        # Сетка под правило "не ближе 60 по X и 40 по Y": соседи только в 3x3 ячейках
+        occupied = SpatialGrid(60, 40)
+        occupied.insert(0, first_x, first_y)
+
+        # Создаем основную лестницу платформ
+        current_y = first_y + step_y
+        last_x = first_x
+
+        while current_y <= end_y:
+            # Генерируем случайное смещение по X относительно предыдущей платформы
+            offset = rng.uniform(-max_x_offset, max_x_offset)
+            new_x = last_x + offset
+
+            # Проверяем, чтобы платформа не выходила за границы комнаты
+            new_x = max(self.left + 50, min(new_x, self.right - 50))
+
+            occupied.insert(len(platforms), new_x, current_y)
+            platforms.append((new_x, current_y, 100, 20))
+
+            last_x = new_x
+            current_y += step_y
+
+        for i in range(40): #это доп платфрмы, потому что путь из основных очень скучный
+            attempts = 0
+            placed = False
+
+            while attempts < 20 and not placed:  # Ограничим попытки
+                x = rng.uniform(self.left + 50, self.right - 50)
+                y = rng.uniform(self.bottom + 100, self.top - 100)
+
+                # Проверяем расстояние до платформ в соседних ячейках
+                too_close = False
+                for index in occupied.query(x, y):
+                    existing_x, existing_y, _, _ = platforms[index]
+                    # Проверяем отдельно по X и Y
+                    dx = abs(existing_x - x)
+                    dy = abs(existing_y - y)
+
+                    # Минимальные расстояния по X и Y
+                    if dx < 60 and dy < 40:  # Если и по X, и по Y близко
+                        too_close = True
+                        break
+
+                if not too_close:
+                    occupied.insert(len(platforms), x, y)
+                    platforms.append((x, y, 100, 20))
+                    placed = True
+
+                attempts += 1
+
+    def generate_enemies(self, rng):
+        # (x, y, стрелок, на потолке, направление, дистанция патруля, таймер стрельбы)
+        enemies = self.enemies
+
+        num_enemies = rng.randint(12, 25)  # От 4 до 8 врагов в комнате
+        shooter_chance = 0.6  # 40% шанс что враг будет стрелком
+
+        # Сетки под проверки расстояний: 80 до платформ, 60 до других врагов
+        platforms = self.platforms
+        platform_grid = SpatialGrid(80)
+        for index, (platform_x, platform_y, _, _) in enumerate(platforms):
+            platform_grid.insert(index, platform_x, platform_y)
+        enemy_grid = SpatialGrid(60)
+
+        for _ in range(num_enemies):
+            # Случайно выбираем стену: 0 - левая, 1 - правая, 2 - потолок
+            wall_choice = rng.randint(0, 2)
+
+            is_shooter = rng.random() < shooter_chance
+
+            if wall_choice == 0:  # Левая стена
+                x = self.left + 25  # Немного отступим от края стены
+                y = rng.uniform(self.bottom + 100, self.top - 100)
+
+            elif wall_choice == 1:  # Правая стена
+                x = self.right - 25  # Немного отступим от края стены
+                y = rng.uniform(self.bottom + 100, self.top - 100)
+
+            else:  # Потолок
+                x = rng.uniform(self.left + 100, self.right - 100)
+                y = self.top - 25  # Немного ниже потолка
+
+            # Проверяем, чтобы враг не спавнился слишком близко к платформам
+            too_close = False
+            for index in platform_grid.query(x, y):
+                platform_x, platform_y, _, _ = platforms[index]
+                dx = abs(platform_x - x)
+                dy = abs(platform_y - y)
+
+                if dx < 80 and dy < 80:  # Если слишком близко к платформе
+                    too_close = True
+                    break
+
+            # Также проверяем расстояние до других врагов
+            for index in enemy_grid.query(x, y):
+                enemy = enemies[index]
+                dx = abs(enemy[0] - x)
+                dy = abs(enemy[1] - y)
+
+                if dx < 60 and dy < 60:  # Если слишком близко к другому врагу
+                    too_close = True
+                    break
+
+            if not too_close:
+                shoot_timer = rng.uniform(0, 2)
+                direction = rng.choice([-1, 1])
+                patrol_distance = rng.randint(80, 150)
+                enemy_grid.insert(len(enemies), x, y)
+                # Если на потолке, двигаемся по горизонтали, на стене - по вертикали
+                enemies.append((x, y, is_shooter, wall_choice == 2, direction, patrol_distance, shoot_timer))
+
+
+# Уже сгенерированные раскладки по (x, y, width, height, wall_thickness, seed)
+LAYOUT_CACHE = {}
+# Ключи раскладок из файла уровня: генератор их не повторит, поэтому из кэша их не убирают
+LEVEL_LAYOUT_KEYS = set()
+
+
+def get_room_layout(x, y, width, height, wall_thickness, seed):
+    """Раскладка из кэша или свежесгенерированная (и положенная в кэш)"""
+    key = (x, y, width, height, wall_thickness, seed)
+    layout = LAYOUT_CACHE.get(key)
+    if layout is None:
+        layout = RoomLayout.generate(*key)
+        LAYOUT_CACHE[key] = layout
+    return layout
+
+
+LAYOUT_MAGIC = b"EOVL"
+LAYOUT_VERSION = 2
+LAYOUT_HEADER = struct.Struct("<4sHHQ")  # магия, версия, число комнат, seed уровня
+ROOM_HEADER = struct.Struct("<HdddddQII")  # номер комнаты, x, y, w, h, стены, seed, платформ, врагов
+PLATFORM_RECORD = struct.Struct("<dddd")
+ENEMY_RECORD = struct.Struct("<dd??bHd")
+
+
+def save_layouts(path, level_seed, layouts):
+    """layouts - {номер комнаты в ROOM_SPECS: RoomLayout}"""
+    with open(path, "wb") as f:
+        f.write(LAYOUT_HEADER.pack(LAYOUT_MAGIC, LAYOUT_VERSION, len(layouts), level_seed))
+        for index, layout in sorted(layouts.items()):
+            f.write(ROOM_HEADER.pack(index, layout.x, layout.y, layout.width, layout.height,
+                                     layout.wall_thickness, layout.seed,
+                                     len(layout.platforms), len(layout.enemies)))
+            for platform in layout.platforms:
+                f.write(PLATFORM_RECORD.pack(*platform))
+            for enemy in layout.enemies:
+                f.write(ENEMY_RECORD.pack(*enemy))
+
+
+def load_layouts(path):
+    """Возвращает seed уровня и {номер комнаты: RoomLayout}"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, count, level_seed = LAYOUT_HEADER.unpack_from(data, 0)
+    if magic != LAYOUT_MAGIC or version != LAYOUT_VERSION:
+        raise ValueError(f"{path}: не файл раскладки комнат (версия {LAYOUT_VERSION})")
+    offset = LAYOUT_HEADER.size
+
+    layouts = {}
+    for _ in range(count):
+        index, x, y, width, height, wall_thickness, seed, platform_count, enemy_count = \
+            ROOM_HEADER.unpack_from(data, offset)
+        offset += ROOM_HEADER.size
+
+        platforms = list(PLATFORM_RECORD.iter_unpack(
+            data[offset:offset + platform_count * PLATFORM_RECORD.size]))
+        offset += platform_count * PLATFORM_RECORD.size
+        enemies = list(ENEMY_RECORD.iter_unpack(
+            data[offset:offset + enemy_count * ENEMY_RECORD.size]))
+        offset += enemy_count * ENEMY_RECORD.size
+
+        # Размеры комнаты в игре целые, так что ключ кэша совпадёт
+        layouts[index] = RoomLayout(int(x), int(y), int(width), int(height), int(wall_thickness),
+                                    seed, platforms, enemies)
+    return level_seed, layouts
+
+
 class Room:
-    def __init__(self, x, y, width, height, wall_thickness=50):
+    def __init__(self, x, y, width, height, wall_thickness=50, array_engine=False,
+                 seed=None, layout=None, staged=False):
         self.x = x
         self.y = y
         self.width = width
@@ -137,22 +656,70 @@ class Room:
         self.enemies = arcade.SpriteList()
         self.bullets = arcade.SpriteList()
 
+        # Сетки для быстрого поиска врагов и пуль рядом с игроком
+        self.enemy_grid = SpatialGrid()
+        self.bullet_grid = SpatialGrid()
+        self.bullet_pool = BulletPool(self.bullets, self.bullet_grid)
+
+        # NPC комнаты, ячейка не меньше радиуса разговора
+        self.npc_grid = SpatialGrid(cell_size=NPC_RANGE)
+
+        # Постройка идёт по шагам: стример растягивает её на несколько тиков
+        self.layout = None
+        self.engine = None
+        self.built = False
+        self.build_steps = self.build(seed, layout, array_engine)
+        if not staged:
+            self.finish_build()
+
+    def build(self, seed, layout, array_engine):
+        """Строит спрайты комнаты, между шагами отдаёт управление (yield)"""
         self.load_textures()
         self.build_room()
-        self.generate_platforms_improved()
-
+        yield
+
+        # Раскладка: готовая, из кэша по seed или генерируем заново
+        if layout is None:
+            if seed is None:
+                seed = random.getrandbits(32)  # Воспроизводимо через random.seed
+                layout = RoomLayout.generate(self.x, self.y, self.width, self.height,
+                                             self.wall_thickness, seed)
+            else:
+                layout = get_room_layout(self.x, self.y, self.width, self.height,
+                                         self.wall_thickness, seed)
+        self.layout = layout
 
-        self.generate_enemies()
+        self.build_platforms()
+        yield
+        self.build_enemies()
+        yield
 
+        # Плитки стен остаются для отрисовки, физика получает склеенные прямоугольники
+        self.build_collision_geometry()
         self.obstacles = arcade.SpriteList()
-        self.obstacles.extend(self.walls)
-        self.obstacles.extend(self.ceilings)
+        self.obstacles.extend(self.collision_walls)
         self.obstacles.extend(self.platforms)
+        yield
+
+        self.build_draw_chunks()
+
+        # Необязательный движок на NumPy для больших комнат
+        if array_engine:
+            from array_engine import ArrayEngine
+            self.engine = ArrayEngine(self)
+        self.built = True
+
+    def build_step(self):
+        next(self.build_steps, None)
+
+    def finish_build(self):
+        for _ in self.build_steps:
+            pass
 
     def load_textures(self):
-        self.wall_texture = arcade.load_texture("images/backgrounds/wall.png")
-        self.floor_texture = arcade.load_texture("images/backgrounds/floor.png")
-        self.ground_texture = arcade.load_texture("images/backgrounds/ground.png")
+        self.wall_texture = TEXTURES.load("images/backgrounds/wall.png")
+        self.floor_texture = TEXTURES.load("images/backgrounds/floor.png")
+        self.ground_texture = TEXTURES.load("images/backgrounds/ground.png")
 
 
     def build_room(self):
@@ -208,129 +775,101 @@ class Room:
             ceiling_sprite.height = self.wall_thickness
             self.ceilings.append(ceiling_sprite)
 
-    def generate_platforms_improved(self):
-        # Параметры генерации
-        start_y = self.bottom + 100  # Начальная высота
-        end_y = self.top - 100  # Конечная высота
-        step_y = 120  # Расстояние между платформами по вертикали
-        max_x_offset = 150  # Максимальное смещение по X относительно предыдущей платформы
-
-        # Генерируем первую платформу в случайном месте внизу
-        first_x = random.uniform(self.left + 100, self.right - 100)
-        first_y = start_y
-        first_platform = Platform(first_x, first_y)
-        self.platforms.append(first_platform)
-
-        # Создаем основную лестницу платформ
-        current_y = first_y + step_y
-        last_x = first_x
-
-        while current_y <= end_y:
-            # Генерируем случайное смещение по X относительно предыдущей платформы
-            offset = random.uniform(-max_x_offset, max_x_offset)
-            new_x = last_x + offset
-
-            # Проверяем, чтобы платформа не выходила за границы комнаты
-            new_x = max(self.left + 50, min(new_x, self.right - 50))
-
-            platform = Platform(new_x, current_y)
-            self.platforms.append(platform)
-
-            last_x = new_x
-            current_y += step_y
-
-        for i in range(40): #это доп платфрмы, потому что путь из основных очень скучный
-            attempts = 0
-            placed = False
-
-            while attempts < 20 and not placed:  # Ограничим попытки
-                x = random.uniform(self.left + 50, self.right - 50)
-                y = random.uniform(self.bottom + 100, self.top - 100)
-
-                # Проверяем расстояние до всех существующих платформ
-                too_close = False
-                for existing_platform in self.platforms:
-                    # Проверяем отдельно по X и Y
-                    dx = abs(existing_platform.center_x - x)
-                    dy = abs(existing_platform.center_y - y)
-
-                    # Минимальные расстояния по X и Y
-                    if dx < 60 and dy < 40:  # Если и по X, и по Y близко
-                        too_close = True
-                        break
-
-                if not too_close:
-                    platform = Platform(x, y)
-                    self.platforms.append(platform)
-                    placed = True
-
-                attempts += 1
+    def build_collision_geometry(self):
+        self.collision_walls = arcade.SpriteList()
+        for left, right, bottom, top in merge_tiles([*self.walls, *self.ceilings]):
+            self.collision_walls.append(arcade.SpriteSolidColor(
+                right - left, top - bottom, (left + right) / 2, (bottom + top) / 2))
+
+    def build_draw_chunks(self):
+        """Раскладывает стены, потолок и платформы по горизонтальным полосам,
+        чтобы рисовать только попавшие в камеру"""
+        bands = {}
+        for sprite in (*self.walls, *self.ceilings, *self.platforms):
+            band = int((sprite.center_y - self.bottom) // DRAW_CHUNK_HEIGHT)
+            bands.setdefault(band, []).append(sprite)
+
+        self.draw_chunks = []
+        for band in sorted(bands):
+            sprites = bands[band]
+            chunk = arcade.SpriteList()
+            chunk.extend(sprites)
+            self.draw_chunks.append((
+                min(sprite.left for sprite in sprites),
+                max(sprite.right for sprite in sprites),
+                min(sprite.bottom for sprite in sprites),
+                max(sprite.top for sprite in sprites),
+                chunk,
+            ))
+
+        # Внешние границы комнаты вместе со стенами
+        self.draw_bounds = (
+            min(chunk[0] for chunk in self.draw_chunks),
+            max(chunk[1] for chunk in self.draw_chunks),
+            min(chunk[2] for chunk in self.draw_chunks),
+            max(chunk[3] for chunk in self.draw_chunks),
+        )
 
-    def generate_enemies(self):
-        num_enemies = random.randint(12, 25)  # От 4 до 8 врагов в комнате
-        shooter_chance = 0.6  # 40% шанс что враг будет стрелком
+    def build_platforms(self):
+        for x, y, width, height in self.layout.platforms:
+            self.platforms.append(Platform(x, y, width, height))
+
+    def build_enemies(self):
+        for x, y, is_shooter, on_ceiling, direction, patrol_distance, shoot_timer in self.layout.enemies:
+            enemy = Enemy(x, y, is_shooter, shoot_timer)
+            enemy.direction = direction
+            enemy.patrol_distance = patrol_distance
+
+            if on_ceiling:
+                enemy.change_x = enemy.speed * enemy.direction
+                enemy.start_x = x
+                enemy.max_x = x + enemy.patrol_distance
+                enemy.min_x = x - enemy.patrol_distance
+                enemy.is_on_ceiling = True
+            else:
+                enemy.change_y = enemy.speed * enemy.direction
+                enemy.start_y = y
+                enemy.max_y = y + enemy.patrol_distance
+                enemy.min_y = y - enemy.patrol_distance
+                enemy.is_on_wall = True
+                enemy.change_x = 0  # Стенные враги двигаются только по вертикали
 
-        for _ in range(num_enemies):
-            # Случайно выбираем стену: 0 - левая, 1 - правая, 2 - потолок
-            wall_choice = random.randint(0, 2)
+            self.enemies.append(enemy)
 
-            is_shooter = random.random() < shooter_chance
+        self.index_enemies()
 
-            if wall_choice == 0:  # Левая стена
-                x = self.left + 25  # Немного отступим от края стены
-                y = random.uniform(self.bottom + 100, self.top - 100)
+    def index_enemies(self):
+        """Заново раскладывает врагов по сетке (после замены self.enemies)"""
+        self.enemy_grid.clear()
+        for enemy in self.enemies:
+            self.enemy_grid.insert(enemy, enemy.center_x, enemy.center_y)
 
-            elif wall_choice == 1:  # Правая стена
-                x = self.right - 25  # Немного отступим от края стены
-                y = random.uniform(self.bottom + 100, self.top - 100)
+    def add_npc(self, npc):
+        self.npc_grid.insert(npc, npc.center_x, npc.center_y)
 
-            else:  # Потолок
-                x = random.uniform(self.left + 100, self.right - 100)
-                y = self.top - 25  # Немного ниже потолка
+    def move_npc(self, npc):
+        """Переносит NPC в сетке, вызывается только когда он сдвинулся"""
+        self.npc_grid.move(npc, npc.center_x, npc.center_y)
 
-            # Проверяем, чтобы враг не спавнился слишком близко к платформам
-            too_close = False
-            for platform in self.platforms:
-                dx = abs(platform.center_x - x)
-                dy = abs(platform.center_y - y)
+    def remove_npc(self, npc):
+        self.npc_grid.remove(npc)
 
-                if dx < 80 and dy < 80:  # Если слишком близко к платформе
-                    too_close = True
-                    break
-
-            # Также проверяем расстояние до других врагов
-            for enemy in self.enemies:
-                dx = abs(enemy.center_x - x)
-                dy = abs(enemy.center_y - y)
-
-                if dx < 60 and dy < 60:  # Если слишком близко к другому врагу
-                    too_close = True
-                    break
-
-            if not too_close:
-                enemy = Enemy(x, y, is_shooter)
-
-                if wall_choice == 2:  # Если на потолке, двигаемся по горизонтали
-                    enemy.direction = random.choice([-1, 1])
-                    enemy.change_x = enemy.speed * enemy.direction
-                    enemy.start_x = x
-                    enemy.patrol_distance = random.randint(80, 150)
-                    enemy.max_x = x + enemy.patrol_distance
-                    enemy.min_x = x - enemy.patrol_distance
-                    enemy.is_on_ceiling = True
-                else:  # Если на стене, двигаемся по вертикали
-                    enemy.direction = random.choice([-1, 1])
-                    enemy.change_y = enemy.speed * enemy.direction
-                    enemy.start_y = y
-                    enemy.patrol_distance = random.randint(80, 150)
-                    enemy.max_y = y + enemy.patrol_distance
-                    enemy.min_y = y - enemy.patrol_distance
-                    enemy.is_on_wall = True
-                    enemy.change_x = 0  # Стенные враги двигаются только по вертикали
-
-                self.enemies.append(enemy)
+    def npc_near(self, x, y, distance=NPC_RANGE):
+        """Ближайший NPC не дальше distance по каждой оси, ищет только в ячейках рядом с точкой"""
+        nearest = None
+        nearest_distance = distance
+        for npc in self.npc_grid.query(x, y):
+            npc_distance = max(abs(npc.center_x - x), abs(npc.center_y - y))
+            if npc_distance < nearest_distance:
+                nearest = npc
+                nearest_distance = npc_distance
+        return nearest
 
     def update_enemies(self, delta_time, player_x, player_y):
+        if self.engine:
+            self.engine.update_enemies(delta_time, player_x, player_y)
+            return
+
         for enemy in self.enemies:
             # Обновляем позицию врага
             enemy.center_x += enemy.change_x
@@ -349,15 +888,19 @@ class Room:
             # Проверяем, чтобы враг не выходил за пределы комнаты
             enemy.center_x = max(self.left + 30, min(enemy.center_x, self.right - 30))
             enemy.center_y = max(self.bottom + 30, min(enemy.center_y, self.top - 30))
+            self.enemy_grid.move(enemy, enemy.center_x, enemy.center_y)
 
             # Если враг стрелок, проверяем возможность выстрела
             if enemy.is_shooter:
                 if enemy.update_shooting(delta_time, player_x, player_y):
-                    bullet = Bullet(enemy.center_x, enemy.center_y,
-                                    player_x, player_y, enemy.bullet_speed)
-                    self.bullets.append(bullet)
+                    self.bullet_pool.spawn(enemy.center_x, enemy.center_y,
+                                           player_x, player_y, enemy.bullet_speed)
 
     def update_bullets(self):
+        if self.engine:
+            self.engine.update_bullets()
+            return
+
         bullets_to_remove = []
 
         for bullet in self.bullets:
@@ -366,18 +909,95 @@ class Room:
                 bullets_to_remove.append(bullet)
 
             # Проверяем, вышла ли пуля за пределы комнаты
-            if (bullet.center_x < self.left - 50 or bullet.center_x > self.right + 50 or
+            elif (bullet.center_x < self.left - 50 or bullet.center_x > self.right + 50 or
                     bullet.center_y < self.bottom - 50 or bullet.center_y > self.top + 50):
                 bullets_to_remove.append(bullet)
+            else:
+                self.bullet_grid.move(bullet, bullet.center_x, bullet.center_y)
 
-        # Удаляем старые пули
+        # Возвращаем старые пули в пул
         for bullet in bullets_to_remove:
-            bullet.remove_from_sprite_lists()
+            self.bullet_pool.release(bullet)
+
+    def enemies_hitting(self, player):
+        if self.engine:
+            return self.engine.enemies_hitting(player)
+        nearby = self.enemy_grid.query(player.center_x, player.center_y)
+        return [enemy for enemy in nearby if arcade.check_for_collision(player, enemy)]
+
+    def bullets_hitting(self, player):
+        if self.engine:
+            return self.engine.bullets_hitting(player)
+        nearby = self.bullet_grid.query(player.center_x, player.center_y)
+        return [bullet for bullet in nearby if arcade.check_for_collision(player, bullet)]
+
+    def remove_bullets(self, bullets):
+        """Удаляет пули из bullets_hitting, все сразу"""
+        if self.engine:
+            self.engine.remove_bullets(bullets)
+            return
+        for bullet in bullets:
+            self.bullet_pool.release(bullet)
+
+    def save_state(self):
+        """Враги и пули комнаты плоскими массивами чисел, без копий спрайтов"""
+        if self.engine:
+            return self.engine.save_state()
+
+        enemies = array("d")
+        for enemy in self.enemies:
+            enemies.extend((enemy.center_x, enemy.center_y, enemy.change_x, enemy.change_y,
+                            enemy.direction, enemy.shoot_timer))
+        bullets = array("d")
+        for bullet in self.bullets:
+            bullets.extend((bullet.center_x, bullet.center_y, bullet.change_x, bullet.change_y,
+                            bullet.lifetime))
+        return enemies, bullets
+
+    def restore_state(self, state):
+        """Возвращает врагов и пуль к save_state на тех же спрайтах.
+
+        Враги после построения комнаты не появляются и не пропадают,
+        поэтому восстанавливаются по порядку. Лишние пули уходят в пул,
+        недостающие берутся из него.
+        """
+        if self.engine:
+            self.engine.restore_state(state)
+            return
+
+        enemies, bullets = state
+        for enemy, (x, y, change_x, change_y, direction, shoot_timer) in zip(self.enemies, zip(*[iter(enemies)] * 6)):
+            enemy.position = (x, y)
+            enemy.change_x = change_x
+            enemy.change_y = change_y
+            enemy.direction = int(direction)
+            enemy.shoot_timer = shoot_timer
+            self.enemy_grid.move(enemy, x, y)
+
+        records = list(zip(*[iter(bullets)] * 5))
+        while len(self.bullets) > len(records):
+            self.bullet_pool.release(self.bullets[-1])
+        for x, y, *_ in records[len(self.bullets):]:
+            self.bullet_pool.spawn(x, y, x, y)
+        for bullet, (x, y, change_x, change_y, lifetime) in zip(self.bullets, records):
+            bullet.position = (x, y)
+            bullet.change_x = change_x
+            bullet.change_y = change_y
+            bullet.lifetime = int(lifetime)
+            self.bullet_grid.move(bullet, x, y)
+
+    def draw(self, view=None): # рисует комнату, view - (left, right, bottom, top) камеры
+        if view is None:
+            view = self.draw_bounds
+        elif not rects_intersect(view, self.draw_bounds):
+            return
+
+        if self.engine:
+            self.engine.sync_sprites()
 
-    def draw(self): # рисует комнату полностью
-        self.walls.draw()
-        self.ceilings.draw()
-        self.platforms.draw()
+        for chunk in self.draw_chunks:
+            if rects_intersect(view, chunk):
+                chunk[4].draw()
         self.enemies.draw()
         self.bullets.draw()
 
@@ -394,6 +1014,225 @@ class Room:
         return x, y
 
 
+class RoomScheduler:
+    """Обновляет только текущую комнату и её соседей, остальные спят.
+
+    Спящая комната копит пропущенные тики и при пробуждении догоняет их,
+    но не больше max_catch_up (за это время пули успевают умереть,
+    а враги пройти патруль). В догоняющих тиках враги не стреляют.
+    """
+
+    def __init__(self, rooms, neighbour_distance=1000, max_catch_up=240):
+        self.neighbour_distance = neighbour_distance
+        self.max_catch_up = max_catch_up
+        self.missed_ticks = {}
+        self.neighbours = {}
+        self.set_rooms(rooms)
+
+    def set_rooms(self, rooms, catch_up=0):
+        """Меняет набор комнат (стриминг), пропущенные тики оставшихся сохраняются.
+
+        Новые комнаты получают catch_up пропущенных тиков: так только что
+        построенная комната догоняет уровень, будто всё это время спала.
+        """
+        added = [room for room in rooms if room not in self.neighbours]
+        self.rooms = rooms
+        self.neighbours = {
+            room: [other for other in rooms if other is not room and
+                   self.gap(room, other) <= self.neighbour_distance]
+            for room in rooms
+        }
+        self.active = list(rooms)
+        self.missed_ticks = {room: ticks for room, ticks in self.missed_ticks.items() if room in self.neighbours}
+        if catch_up:
+            for room in added:
+                self.missed_ticks[room] = catch_up
+
+    @staticmethod
+    def gap(room, other):
+        """Расстояние между границами двух комнат (0, если пересекаются)"""
+        dx = max(0, other.left - room.right, room.left - other.right)
+        dy = max(0, other.bottom - room.top, room.bottom - other.top)
+        return max(dx, dy)
+
+    def update(self, current_room, delta_time, player_x, player_y, profiler=None):
+        if current_room not in self.neighbours:
+            active = set(self.rooms)
+        else:
+            active = {current_room, *self.neighbours[current_room]}
+
+        for room in self.rooms:
+            if room not in active:
+                self.missed_ticks[room] = self.missed_ticks.get(room, 0) + 1
+                continue
+
+            missed = min(self.missed_ticks.pop(room, 0), self.max_catch_up)
+            for tick in range(missed + 1):
+                # В догоняющих тиках игрока рядом не было: цель вне дальности, враги не стреляют
+                if tick < missed:
+                    target_x, target_y = FAR_AWAY
+                else:
+                    target_x, target_y = player_x, player_y
+                if profiler is None:
+                    room.update_enemies(delta_time, target_x, target_y)
+                    room.update_bullets()
+                    continue
+                with profiler.measure("update.enemies"):
+                    room.update_enemies(delta_time, target_x, target_y)
+                with profiler.measure("update.bullets"):
+                    room.update_bullets()
+
+        self.active = [room for room in self.rooms if room in active]
+
+
+class RoomStreamer:
+    """Держит построенными только комнаты рядом с игроком.
+
+    Комната строится, когда игрок ближе load_distance к её границам, и
+    разбирается, когда дальше unload_distance. Её препятствия по одной
+    добавляются в физику и убираются из неё.
+
+    С prefetch_distance раскладку (генерация и граф прыжков) готовит
+    фоновый поток, а спрайты комнаты строятся по шагу за тик. Спрайты и
+    OpenGL трогает только основной поток, поэтому постройку можно только
+    растянуть, но не унести в фон. К load_distance комнате остаётся
+    подключиться к физике.
+    Когда игрок дальше evict_distance, раскладка уходит из LAYOUT_CACHE
+    (кроме загруженных из файла уровня), так что кэш держит только то,
+    что рядом с игроком.
+    """
+
+    def __init__(self, specs, seed, array_engine=False,
+                 load_distance=ROOM_LOAD_DISTANCE, unload_distance=ROOM_UNLOAD_DISTANCE,
+                 prefetch_distance=ROOM_PREFETCH_DISTANCE, evict_distance=ROOM_EVICT_DISTANCE):
+        self.specs = specs
+        self.seed = seed
+        self.array_engine = array_engine
+        self.load_distance = load_distance
+        self.unload_distance = unload_distance
+        self.prefetch_distance = prefetch_distance
+        self.evict_distance = evict_distance
+        self.loaded = {}  # индекс в specs -> Room
+        self.building = {}  # индекс в specs -> Room, которая строится по шагам
+        self.physics_engine = None
+
+        # Фоновая генерация раскладок: очередь ключей и поток, который её разбирает
+        self.requests = queue.Queue()
+        self.queued = set()  # Ключи в очереди или в работе
+        self.worker = None
+
+    @staticmethod
+    def distance(spec, x, y):
+        """Расстояние от точки до прямоугольника комнаты"""
+        dx = max(0, spec["x"] - spec["width"] / 2 - x, x - spec["x"] - spec["width"] / 2)
+        dy = max(0, spec["y"] - spec["height"] / 2 - y, y - spec["y"] - spec["height"] / 2)
+        return max(dx, dy)
+
+    @classmethod
+    def nearby(cls, specs, x, y, distance):
+        return [i for i, spec in enumerate(specs) if cls.distance(spec, x, y) <= distance]
+
+    def world_bounds(self):
+        """(left, right, bottom, top) всех комнат уровня, построенных или нет"""
+        return (
+            min(spec["x"] - spec["width"] / 2 for spec in self.specs),
+            max(spec["x"] + spec["width"] / 2 for spec in self.specs),
+            min(spec["y"] - spec["height"] / 2 for spec in self.specs),
+            max(spec["y"] + spec["height"] / 2 for spec in self.specs),
+        )
+
+    @property
+    def rooms(self):
+        return [self.loaded[i] for i in sorted(self.loaded)]
+
+    def attach(self, physics_engine):
+        self.physics_engine = physics_engine
+        for room in self.rooms:
+            physics_engine.add_walls(room.get_collision_sprites())
+
+    def update(self, x, y):
+        """Строит и разбирает комнаты вокруг точки, возвращает True, если набор изменился"""
+        changed = False
+        for i, spec in enumerate(self.specs):
+            distance = self.distance(spec, x, y)
+            if i not in self.loaded and distance <= self.load_distance:
+                self.load(i)
+                changed = True
+            elif i in self.loaded and distance > self.unload_distance:
+                self.unload(i)
+                changed = True
+
+            if distance <= self.prefetch_distance:
+                if i not in self.loaded:
+                    self.prefetch(i)
+            elif distance > self.evict_distance:
+                self.evict(i)
+
+        # Один шаг постройки за тик, чтобы не было длинных кадров
+        for room in self.building.values():
+            if not room.built:
+                room.build_step()
+                break
+        return changed
+
+    def layout_key(self, i):
+        spec = self.specs[i]
+        return (spec["x"], spec["y"], spec["width"], spec["height"],
+                spec.get("wall_thickness", 50), self.seed + i)
+
+    def prefetch(self, i):
+        """Ставит раскладку комнаты в очередь фонового потока, готовую - в постройку"""
+        key = self.layout_key(i)
+        if key in LAYOUT_CACHE:
+            if i not in self.building:
+                self.building[i] = Room(**self.specs[i], array_engine=self.array_engine,
+                                        seed=self.seed + i, staged=True)
+            return
+        if key in self.queued:
+            return
+        self.queued.add(key)
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.prefetch_layouts, daemon=True)
+            self.worker.start()
+        self.requests.put(key)
+
+    def prefetch_layouts(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                return
+            get_room_layout(*key)
+            self.queued.discard(key)
+
+    def evict(self, i):
+        """Убирает из кэша раскладку далёкой комнаты, при возврате она сгенерируется заново"""
+        self.building.pop(i, None)
+        key = self.layout_key(i)
+        if key not in self.queued and key not in LEVEL_LAYOUT_KEYS:
+            LAYOUT_CACHE.pop(key, None)
+
+    def close(self):
+        """Останавливает фоновый поток, стример больше не нужен"""
+        if self.worker is not None:
+            self.requests.put(None)
+            self.worker = None
+
+    def load(self, i):
+        # Обычно комната уже построена по шагам, иначе достраивается здесь
+        room = self.building.pop(i, None)
+        if room is None:
+            room = Room(**self.specs[i], array_engine=self.array_engine, seed=self.seed + i)
+        room.finish_build()
+        self.loaded[i] = room
+        if self.physics_engine:
+            self.physics_engine.add_walls(room.get_collision_sprites())
+
+    def unload(self, i):
+        room = self.loaded.pop(i)
+        if self.physics_engine:
+            self.physics_engine.remove_walls(room.get_collision_sprites())
+
+
 class WinWindow(arcade.View):
     def __init__(self):
         super().__init__()
@@ -420,8 +1259,9 @@ class WinWindow(arcade.View):
 
 
 class LoseWindow(arcade.View):
-    def __init__(self):
+    def __init__(self, game_view):
         super().__init__()
+        self.game_view = game_view
         self.batch = Batch()
         self.txt = None
 
@@ -443,6 +1283,26 @@ class LoseWindow(arcade.View):
         self.clear()
         self.batch.draw()
 
+    def on_update(self, delta_time):
+        # При повторе ENTER или F9 приходят из записи: игра читает её и отсюда
+        game = self.game_view
+        if game.replay is None:
+            return
+        game.on_update(delta_time)
+        if not game.game_over:
+            self.window.show_view(game)
+
+    def on_key_press(self, key, modifiers):
+        # ENTER - заново, F9 - к контрольной точке. Клавишу обрабатывает
+        # сама игра, чтобы она попала в запись ввода
+        if key == arcade.key.ENTER or (key == arcade.key.F9 and self.game_view.checkpoint is not None):
+            self.window.show_view(self.game_view)
+            self.game_view.on_key_press(key, modifiers)
+
+    def on_key_release(self, key, modifiers):
+        # Клавиши, отпущенные на экране проигрыша, не должны остаться зажатыми после перезапуска
+        self.game_view.on_key_release(key, modifiers)
+
 
 class StartView(arcade.View):
     def __init__(self, game_view):
@@ -452,6 +1312,9 @@ class StartView(arcade.View):
         self.txt = None
 
     def on_show_view(self):
+        # Пока висит заставка, готовим уровень в фоне
+        self.game_view.start_preparing()
+
         arcade.set_background_color(arcade.color.BLACK)
         self.batch = Batch()
         self.txt = arcade.Text(
@@ -476,25 +1339,31 @@ class StartView(arcade.View):
 
 
 class NPC(arcade.Sprite):
-    def __init__(self, x, y):
-        super().__init__(":resources:images/tiles/mushroomRed.png", scale=0.8)
+    def __init__(self, x, y, room_index=0):
+        super().__init__(TEXTURES.load(":resources:images/tiles/mushroomRed.png"), scale=0.8)
         self.center_x = x
         self.center_y = y
+        self.room_index = room_index  # Индекс комнаты в MyGame.ROOM_SPECS
+        self.player_in_range = False
         self.dialog_active = False
         self.dialog_phrases = [
             "Привет! Я NPC.",
             "test"
         ]
         self.current_phrase_index = 0
-        self.dialog_sprite = None
+
+        # Текст диалога создаётся при первой отрисовке и дальше только меняется
+        self.phrase_text = None
+        self.progress_text = None
+        self.hint_text = None
+        self.text_position = None
+        self.text_dirty = True
 
     def interact(self):
         if not self.dialog_active:
             # Начинаем диалог с первой фразы
             self.dialog_active = True
             self.current_phrase_index = 0
-            self.dialog_sprite.center_x = self.center_x
-            self.dialog_sprite.center_y = self.center_y + 120
         else:
             self.current_phrase_index += 1
 
@@ -502,7 +1371,7 @@ class NPC(arcade.Sprite):
             if self.current_phrase_index >= len(self.dialog_phrases):
                 self.dialog_active = False
                 self.current_phrase_index = 0
-                self.dialog_sprite = None
+        self.text_dirty = True
 
     def get_current_phrase(self):
         if self.current_phrase_index < len(self.dialog_phrases):
@@ -512,56 +1381,86 @@ class NPC(arcade.Sprite):
     def get_progress_text(self):
         return f"{self.current_phrase_index + 1}/{len(self.dialog_phrases)}"
 
-    def draw_dialog(self):
-        if not self.dialog_active:
-            return
+    def on_player_enter(self):
+        self.player_in_range = True
+
+    def on_player_leave(self):
+        self.player_in_range = False
 
-        # Рисуем текст диалога рядом с уменьшенной текстурой
-        text_x = self.center_x + 60
-        text_y = self.center_y + 120
+    def save_state(self):
+        return self.dialog_active, self.current_phrase_index, self.player_in_range
 
-        # Текст текущей фразы
-        current_phrase = self.get_current_phrase()
-        arcade.draw_text(
-            current_phrase,
-            text_x, text_y,
+    def restore_state(self, state):
+        self.dialog_active, self.current_phrase_index, self.player_in_range = state
+        self.text_dirty = True
+
+    def create_dialog_text(self, batch):
+        self.phrase_text = arcade.Text(
+            "", 0, 0,
             arcade.color.BLACK, 12,
             anchor_x="center", anchor_y="center",
-            width=180, align="center"
+            width=180, align="center",
+            batch=batch,
         )
-
-        # Проверяем колличество сказанных фраз
-        progress_text = self.get_progress_text()
-        arcade.draw_text(
-            progress_text,
-            text_x, text_y - 20,
+        self.progress_text = arcade.Text(
+            "", 0, 0,
             arcade.color.DARK_GRAY, 10,
-            anchor_x="center", anchor_y="center"
+            anchor_x="center", anchor_y="center",
+            batch=batch,
         )
-
-        # Подсказка для переключения/закрытия
-        if self.current_phrase_index < len(self.dialog_phrases) - 1:
-            hint_text = "Нажмите E для продолжения"
-        else:
-            hint_text = "Нажмите E для завершения"
-
-        arcade.draw_text(
-            hint_text,
-            text_x, text_y + 30,
+        self.hint_text = arcade.Text(
+            "", 0, 0,
             arcade.color.DARK_GREEN, 10,
-            anchor_x="center", anchor_y="center"
+            anchor_x="center", anchor_y="center",
+            batch=batch,
         )
+        self.text_position = None
+        self.text_dirty = True
+
+    def update_dialog_text(self, batch):
+        """Переносит фразу и позицию в объекты Text батча, если они изменились.
+
+        Сам текст рисуется вместе со всем батчем одним вызовом.
+        """
+        if self.phrase_text is None:
+            self.create_dialog_text(batch)
+
+        if self.text_dirty:
+            self.text_dirty = False
+            for text in (self.phrase_text, self.progress_text, self.hint_text):
+                text.visible = self.dialog_active
+            if self.dialog_active:
+                # Текст текущей фразы и колличество сказанных фраз
+                self.phrase_text.text = self.get_current_phrase()
+                self.progress_text.text = self.get_progress_text()
+
+                # Подсказка для переключения/закрытия
+                if self.current_phrase_index < len(self.dialog_phrases) - 1:
+                    self.hint_text.text = "Нажмите E для продолжения"
+                else:
+                    self.hint_text.text = "Нажмите E для завершения"
+
+        if not self.dialog_active:
+            return
+
+        # Текст диалога над NPC, двигается только вместе с ним
+        position = (self.center_x + 60, self.center_y + 120)
+        if position != self.text_position:
+            self.text_position = position
+            text_x, text_y = position
+            self.phrase_text.position = (text_x, text_y)
+            self.progress_text.position = (text_x, text_y - 20)
+            self.hint_text.position = (text_x, text_y + 30)
 
 
 class Player(arcade.Sprite):
     def __init__(self, image_path="images/npc/player_good_npc.png"):
 
         try:
-            super().__init__(image_path, scale=0.5)
+            super().__init__(TEXTURES.load(image_path), scale=0.5)
         except FileNotFoundError:
 
-            texture = arcade.make_soft_square_texture(50, arcade.color.BLUE)
-            super().__init__(texture, scale=0.5)
+            super().__init__(TEXTURES.soft_square(50, arcade.color.BLUE), scale=0.5)
 
         self.speed = 3
         self.sprint_speed = 5
@@ -571,6 +1470,7 @@ class Player(arcade.Sprite):
         self.is_sprinting = False
         self.is_alive = True  # Добавляем флаг жизни игрока
         self.is_won = False
+        self.world_width = WORLD_WIDTH
 
     def setup_physics(self, physics_engine):
         self.physics_engine = physics_engine
@@ -592,8 +1492,8 @@ class Player(arcade.Sprite):
         if self.left < 0:
             self.left = 0
             self.change_x = 0
-        if self.right > WORLD_WIDTH:
-            self.right = WORLD_WIDTH
+        if self.right > self.world_width:
+            self.right = self.world_width
             self.change_x = 0
 
     def move(self, direction):
@@ -635,10 +1535,51 @@ class Player(arcade.Sprite):
         self.change_x = 0
         self.change_y = 0
 
+    def save_state(self):
+        return (self.position, self.change_x, self.change_y, self.scale_x, self.speed,
+                self.can_jump, self.is_sprinting, self.is_alive, self.is_won)
+
+    def restore_state(self, state):
+        (self.position, self.change_x, self.change_y, self.scale_x, self.speed,
+         self.can_jump, self.is_sprinting, self.is_alive, self.is_won) = state
+
+
+class GameSnapshot:
+    """Изменчивое состояние уровня для MyGame.restore.
+
+    Раскладки комнат не меняются и лежат в LAYOUT_CACHE, поэтому снимок
+    хранит только номера построенных комнат (индексы в ROOM_SPECS) и
+    состояние их врагов и пуль, а не спрайты.
+    """
+
+    def __init__(self, tick, player, camera, game_over, npcs, near_npc,
+                 current_room, rooms, active_rooms, missed_ticks, held_keys):
+        self.tick = tick
+        self.player = player
+        self.camera = camera
+        self.game_over = game_over
+        self.npcs = npcs
+        self.near_npc = near_npc  # Индекс в MyGame.npcs или None
+        self.current_room = current_room
+        self.rooms = rooms  # индекс комнаты -> Room.save_state()
+        self.active_rooms = active_rooms
+        self.missed_ticks = missed_ticks
+        self.held_keys = held_keys  # (left_pressed, right_pressed, shift_pressed) для rewind
+
 
 class MyGame(arcade.View):
-    def __init__(self):
-        super().__init__()
+    # Комнаты уровня: room1 и room2
+    ROOM_SPECS = (
+        dict(x=450, y=2700, width=600, height=5000),
+        dict(x=2000, y=2700, width=600, height=5000),
+    )
+    PLAYER_START = (400, 300)
+    NPC_SPECS = (
+        dict(x=600, y=300, room_index=0),
+    )
+
+    def __init__(self, window=None):
+        super().__init__(window)
         self.scene = None
         self.player = None
         self.physics_engine = None
@@ -659,6 +1600,37 @@ class MyGame(arcade.View):
         # Добавляем комнаты
         self.rooms = []
         self.current_room = None
+        self.room_scheduler = None
+        self.room_streamer = None
+        self.world_width = WORLD_WIDTH
+        self.world_height = WORLD_HEIGHT
+        self.array_engine = False  # Враги и пули комнат в массивах NumPy
+        self.level_seed = None  # Перезапуск с тем же seed берёт комнаты из кэша
+        self.prepare_thread = None
+
+        # Замеры фаз кадра, F3 показывает оверлей
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        self.profiler_batch = None
+        self.profiler_text = None
+        self.telemetry = None
+
+        # Симуляция идёт шагами FIXED_STEP, остаток времени копится между кадрами
+        self.accumulator = 0.0
+        self.max_catch_up = MAX_CATCH_UP_STEPS
+        self.render_alpha = 0.0
+        self.prev_player_position = None
+        self.prev_camera_position = None
+
+        # Номер шага симуляции, не сбрасывается при перезапуске: по нему пишется ввод
+        self.tick = 0
+        self.level_start_tick = 0  # Тик setup или перезапуска, с него идёт время уровня
+        self.recorder = None
+        self.replay = None
+
+        # Снимок сразу после setup для перезапуска и контрольная точка игрока
+        self.start_snapshot = None
+        self.checkpoint = None
 
     def center_camera_to_player(self):
         cam_x, cam_y = self.camera.position
@@ -685,188 +1657,535 @@ class MyGame(arcade.View):
         elif py > top:
             cam_y += (py - top)
 
-        cam_x = max(half_w, min(cam_x, WORLD_WIDTH - half_w))
-        cam_y = max(half_h, min(cam_y, WORLD_HEIGHT - half_h))
+        cam_x = max(half_w, min(cam_x, self.world_width - half_w))
+        cam_y = max(half_h, min(cam_y, self.world_height - half_h))
 
         self.camera.position = (cam_x, cam_y)
 
     def setup(self):
-        self.background = arcade.load_texture("images/backgrounds/background.png")
-
-        self.camera = arcade.Camera2D()
+        # Ждём фоновую подготовку, если она запущена, и дальше берём всё из кэшей
+        if self.prepare_thread is not None:
+            self.prepare_thread.join()
+            self.prepare_thread = None
 
         self.game_over = False
         self.game_over_text = None
         self.pause_fl = False
+        self.npcs = None
+        self.near_npc = None
 
         self.scene = arcade.Scene()
 
         self.player = Player()
-        self.player.center_x = 400
-        self.player.center_y = 300
+        self.player.center_x, self.player.center_y = self.PLAYER_START
         self.scene.add_sprite("Player", self.player)
 
+        self.level_start_tick = self.tick
         self.create_rooms()
 
+        # Размер мира - по всем комнатам уровня, но не меньше прежнего
+        _, right, _, top = self.room_streamer.world_bounds()
+        self.world_width = max(WORLD_WIDTH, math.ceil(right + 100))
+        self.world_height = max(WORLD_HEIGHT, math.ceil(top + 100))
+        self.player.world_width = self.world_width
+
+        self.background = BackgroundLayer(TEXTURES.load("images/backgrounds/background.png"),
+                                          columns=math.ceil(self.world_width / SCREEN_WIDTH),
+                                          rows=math.ceil(self.world_height / SCREEN_HEIGHT))
+        self.pack_textures()
+
+        self.camera = self.create_camera()
+
+        # Весь текст в мире (диалоги, подсказка) рисуется одним батчем
+        self.text_batch = Batch()
+        self.prompt_text = None
+
         self.npcs = arcade.SpriteList()
         if self.rooms:
-            npc = NPC(600, 300)
-            self.npcs.append(npc)
+            for spec in self.NPC_SPECS:
+                self.npcs.append(NPC(**spec))
             self.scene.add_sprite_list("NPCs", sprite_list=self.npcs)
+        self.index_npcs()
 
 
-        all_walls = arcade.SpriteList()
-        for room in self.rooms:
-            all_walls.extend(room.get_collision_sprites())
+        # Препятствия комнат лежат в сетке физики, стример добавляет и убирает их по комнате
+        self.physics_engine = PlatformerPhysics(self.player, gravity_constant=0.5)
+        self.room_streamer.attach(self.physics_engine)
+        self.player.setup_physics(self.physics_engine)
 
-        self.physics_engine = arcade.PhysicsEnginePlatformer(
-            self.player, gravity_constant=0.5, walls=all_walls
+        self.accumulator = 0.0
+        self.render_alpha = 0.0
+        self.prev_player_position = self.player.position
+        self.prev_camera_position = self.camera.position
+
+        self.start_snapshot = self.snapshot()
+        self.checkpoint = None
+
+    def snapshot(self):
+        """Снимок игрока, врагов, пуль, NPC и камеры, делается между шагами симуляции"""
+        loaded = self.room_streamer.loaded
+        index = {room: i for i, room in loaded.items()}
+        scheduler = self.room_scheduler
+        return GameSnapshot(
+            tick=self.tick,
+            player=self.player.save_state(),
+            camera=self.camera.position,
+            game_over=self.game_over,
+            npcs=[npc.save_state() for npc in self.npcs],
+            near_npc=None if self.near_npc is None else self.npcs.index(self.near_npc),
+            current_room=index.get(self.current_room),
+            rooms={i: room.save_state() for i, room in loaded.items()},
+            active_rooms=[index[room] for room in scheduler.active],
+            missed_ticks={index[room]: ticks for room, ticks in scheduler.missed_ticks.items()},
+            held_keys=(self.left_pressed, self.right_pressed, self.shift_pressed),
         )
-        self.player.setup_physics(self.physics_engine)
 
-        self.near_npc = None
+    def restore(self, snapshot):
+        """Возвращает уровень к снимку на месте, в отличие от setup.
+
+        Спрайты, списки, физика и текстуры остаются прежними. Заново
+        строятся только комнаты, которые стример с тех пор разобрал.
+        Счётчик тиков не трогается: ввод пишется дальше по порядку.
+        """
+        streamer = self.room_streamer
+        for i in list(streamer.loaded):
+            if i not in snapshot.rooms:
+                streamer.unload(i)
+        for i, state in snapshot.rooms.items():
+            if i not in streamer.loaded:
+                streamer.load(i)
+            streamer.loaded[i].restore_state(state)
+
+        loaded = streamer.loaded
+        self.current_room = loaded.get(snapshot.current_room)
+        self.refresh_rooms()
+        self.room_scheduler.active = [loaded[i] for i in snapshot.active_rooms]
+        self.room_scheduler.missed_ticks = {loaded[i]: ticks for i, ticks in snapshot.missed_ticks.items()}
+
+        self.player.restore_state(snapshot.player)
+        for npc, state in zip(self.npcs, snapshot.npcs):
+            npc.restore_state(state)
+        self.near_npc = None if snapshot.near_npc is None else self.npcs[snapshot.near_npc]
+
+        self.game_over = snapshot.game_over
+        self.game_over_text = None
+        self.camera.position = snapshot.camera
+
+        self.accumulator = 0.0
+        self.render_alpha = 0.0
+        self.prev_player_position = self.player.position
+        self.prev_camera_position = self.camera.position
+
+    def restart(self):
+        """Перезапуск уровня: возврат к снимку после setup вместо нового setup"""
+        self.restore(self.start_snapshot)
+        self.level_start_tick = self.tick
+
+    def rewind(self, snapshot):
+        """Перемотка к снимку вместе со счётчиком тиков, повтором и записью ввода.
+
+        Зажатые клавиши тоже берутся из снимка: ввод после перемотки идёт
+        заново с тика снимка. restore их не трогает, там клавиатура живая.
+        """
+        self.restore(snapshot)
+        self.left_pressed, self.right_pressed, self.shift_pressed = snapshot.held_keys
+        self.tick = snapshot.tick
+        if self.replay is not None:
+            self.replay.seek(self.tick)
+        if self.recorder is not None:
+            self.recorder.truncate(self.tick)
+
+    def prepare(self):
+        """CPU-часть setup: подготовка текстур и генерация раскладок комнат.
+
+        Не создаёт спрайтов и ресурсов OpenGL, поэтому работает в фоновом потоке.
+        """
+        if self.level_seed is None:
+            self.level_seed = random.getrandbits(32)
+
+        TEXTURES.warm_up()
+
+        # Только комнаты, которые стример построит на старте
+        start_x, start_y = self.PLAYER_START
+        for i in RoomStreamer.nearby(self.ROOM_SPECS, start_x, start_y, ROOM_LOAD_DISTANCE):
+            spec = self.ROOM_SPECS[i]
+            get_room_layout(spec["x"], spec["y"], spec["width"], spec["height"], 50, self.level_seed + i)
+
+    def start_preparing(self):
+        if self.prepare_thread is None:
+            self.prepare_thread = threading.Thread(target=self.prepare, daemon=True)
+            self.prepare_thread.start()
+
+    def pack_textures(self):
+        TEXTURES.pack(self.window.ctx.default_atlas)
+
+    def create_camera(self):
+        return arcade.Camera2D()
+
+    def camera_view(self):
+        """Видимая область мира (left, right, bottom, top)"""
+        cam_x, cam_y = self.camera.position
+        half_w = self.camera.viewport_width / self.camera.zoom / 2
+        half_h = self.camera.viewport_height / self.camera.zoom / 2
+        return cam_x - half_w, cam_x + half_w, cam_y - half_h, cam_y + half_h
 
     def create_rooms(self):
-        self.rooms = []
+        if self.level_seed is None:
+            self.level_seed = random.getrandbits(32)
 
-        self.room1 = Room(x=450, y=2700, width=600, height=5000)
-        self.rooms.append(self.room1)
-        self.room2 = Room(x=2000, y=2700, width=600, height=5000)
-        self.rooms.append(self.room2)
+        if self.room_streamer is not None:
+            self.room_streamer.close()
+        self.room_streamer = RoomStreamer(self.ROOM_SPECS, self.level_seed, array_engine=self.array_engine)
+        self.room_streamer.update(self.player.center_x, self.player.center_y)
+        self.room_scheduler = RoomScheduler([])
+        self.refresh_rooms()
 
         self.current_room = self.room1
 
-    def check_npc_proximity(self):
-        self.near_npc = None
+    def refresh_rooms(self):
+        """Обновляет ссылки на комнаты после того, как стример что-то построил или разобрал"""
+        self.rooms = self.room_streamer.rooms
+        self.room1 = self.room_streamer.loaded.get(0)
+        self.room2 = self.room_streamer.loaded.get(1)
+        self.room_scheduler.set_rooms(self.rooms, catch_up=self.tick - self.level_start_tick)
+        if self.current_room not in self.rooms:
+            self.current_room = self.room1
+        self.index_npcs()
+
+    def index_npcs(self):
+        """Кладёт NPC в сетки их комнат: только что построенная комната приходит пустой"""
+        if not self.npcs:
+            return
         for npc in self.npcs:
-            distance_x = abs(npc.center_x - self.player.center_x)
-            distance_y = abs(npc.center_y - self.player.center_y)
+            room = self.room_streamer.loaded.get(npc.room_index)
+            if room is not None and npc not in room.npc_grid.object_cells:
+                room.add_npc(npc)
+
+    def save_level(self, path):
+        """Сохраняет все комнаты уровня, и построенные стримером, и нет"""
+        streamer = self.room_streamer
+        layouts = {}
+        for i in range(len(streamer.specs)):
+            room = streamer.loaded.get(i)
+            layouts[i] = room.layout if room is not None else get_room_layout(*streamer.layout_key(i))
+        save_layouts(path, self.level_seed, layouts)
+
+    def load_level(self, path):
+        """Кладёт комнаты из файла в кэш, следующий setup возьмёт их оттуда"""
+        self.level_seed, layouts = load_layouts(path)
+        for layout in layouts.values():
+            LAYOUT_CACHE[layout.key()] = layout
+            LEVEL_LAYOUT_KEYS.add(layout.key())
+
+    def start_recording(self, path):
+        """Пишет нажатия по тикам, файл сохраняется в stop_recording"""
+        self.recorder = InputRecorder(path)
+
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        if self.player is not None:
+            self.recorder.save(self.level_seed, self.array_engine, self.tick, self.player.position)
+        self.recorder = None
+
+    def start_replay(self, replay):
+        """Берёт seed и ввод из записи, клавиатура до конца повтора игнорируется"""
+        self.replay = replay
+        self.level_seed = replay.seed
+        self.array_engine = replay.array_engine
+
+    def apply_replay_events(self):
+        for _, key, pressed in self.replay.events_until(self.tick):
+            if pressed:
+                self.handle_key_press(key)
+            else:
+                self.handle_key_release(key)
 
-            # Если игрок находится в радиусе 100 пикселей от NPC
-            if distance_x < 100 and distance_y < 100:
-                self.near_npc = npc
-                break
+    def start_telemetry(self, path):
+        """Пишет каждый кадр в path (.jsonl или .csv) до stop_telemetry"""
+        self.stop_telemetry()
+        self.telemetry = TelemetryWriter(path)
+        self.telemetry_start = time.perf_counter()
+        self.profiler.add_listener(self.write_telemetry)
+
+    def stop_telemetry(self):
+        if self.telemetry is None:
+            return
+        self.profiler.remove_listener(self.write_telemetry)
+        self.telemetry.close()
+        self.telemetry = None
+
+    def write_telemetry(self, frame):
+        rooms = {}
+        current = None
+        for i, room in sorted(self.room_streamer.loaded.items()):
+            rooms[i] = (len(room.enemies), len(room.bullets))
+            if room is self.current_room:
+                current = i
+
+        self.telemetry.write({
+            "frame": self.profiler.frames,
+            "time": round(time.perf_counter() - self.telemetry_start, 4),
+            "frame_ms": round(frame["frame"] * 1000, 3),
+            "update_ms": round(frame.get("update", 0.0) * 1000, 3),
+            "draw_ms": round(frame.get("draw", 0.0) * 1000, 3),
+            "room": current,
+            "rooms": rooms,
+        })
+
+    def check_npc_proximity(self):
+        """Ищет NPC рядом с игроком в сетке текущей комнаты.
+
+        При смене ближайшего NPC старый получает on_player_leave, новый - on_player_enter.
+        """
+        npc = None
+        if self.current_room is not None:
+            npc = self.current_room.npc_near(self.player.center_x, self.player.center_y)
+        if npc is self.near_npc:
+            return
+
+        if self.near_npc is not None:
+            self.near_npc.on_player_leave()
+        self.near_npc = npc
+        if npc is not None:
+            npc.on_player_enter()
 
     def check_collisions(self):
         if not self.player.is_alive or self.game_over:
             return
 
-        for room in self.rooms:
+        # Спящие комнаты заморожены и далеко от игрока
+        for room in self.room_scheduler.active:
 
-            collision_list = arcade.check_for_collision_with_list(self.player, room.enemies)
+            collision_list = room.enemies_hitting(self.player)
             if collision_list:
-                print("loose - столкнулся с врагом")
-                self.player.die()
-                self.window.show_view(LoseWindow())
-                self.game_over = True
+                self.lose("столкнулся с врагом")
                 break
 
             # Проверяем столкновение игрока с пулями в комнате
-            bullet_collision = arcade.check_for_collision_with_list(self.player, room.bullets)
+            bullet_collision = room.bullets_hitting(self.player)
             if bullet_collision:
-                print("loose - попал под обстрел")
-                # Удаляем пулю, в которую попал игрок
-                for bullet in bullet_collision:
-                    bullet.remove_from_sprite_lists()
-
-                self.player.die()
-                self.window.show_view(LoseWindow())
-                self.game_over = True
+                # Удаляем пули, в которые попал игрок
+                room.remove_bullets(bullet_collision)
+
+                self.lose("попал под обстрел")
                 break
 
+    def lose(self, reason):
+        print(f"loose - {reason}")
+        self.player.die()
+        self.window.show_view(LoseWindow(self))
+        self.game_over = True
+
+    def win(self):
+        self.window.show_view(WinWindow())
+        #починить окно победы
+        print('победа')
+
+    def interpolate(self, previous, current):
+        """Позиция между двумя последними шагами симуляции, телепорты не сглаживаем"""
+        if previous is None:
+            return current
+        dx = current[0] - previous[0]
+        dy = current[1] - previous[1]
+        if abs(dx) > 100 or abs(dy) > 100:
+            return current
+        alpha = self.render_alpha
+        return previous[0] + dx * alpha, previous[1] + dy * alpha
+
     def on_draw(self):
-        self.clear()
+        with self.profiler.measure("draw"):
+            # Игрок и камера рисуются с долей render_alpha следующего шага
+            player_position = self.player.position
+            camera_position = self.camera.position
+            self.player.position = self.interpolate(self.prev_player_position, player_position)
+            self.camera.position = self.interpolate(self.prev_camera_position, camera_position)
 
-        # Фон
-        for i in range(10):
-            for j in range(10):
-                arcade.draw_texture_rect(
-                    self.background,
-                    arcade.rect.XYWH(0 + SCREEN_WIDTH * j, 0 + SCREEN_HEIGHT * i, SCREEN_WIDTH, SCREEN_HEIGHT),
-                )
+            self.draw_world()
 
-        self.camera.use()
+            self.player.position = player_position
+            self.camera.position = camera_position
 
-        # Рисуем все комнаты
-        for room in self.rooms:
-            room.draw()
+        if self.show_profiler:
+            self.draw_profiler()
+        self.profiler.end_frame()
 
-        # Рисуем сцену (игрока, NPC и др.)
-        self.scene.draw()
+    def draw_world(self):
+        profiler = self.profiler
+        self.clear()
 
-        # Рисуем диалоги всех NPC
-        for npc in self.npcs:
-            npc.draw_dialog()
+        self.camera.use()
+
+        # Фон
+        with profiler.measure("draw.background"):
+            self.background.draw(self.camera)
 
-        # Рисуем подсказку для взаимодействия, если игрок рядом с NPC
-        if self.near_npc and not self.near_npc.dialog_active and self.player.is_alive:
-            arcade.draw_text(
+        # Рисуем только то, что попадает в камеру
+        with profiler.measure("draw.rooms"):
+            view = self.camera_view()
+            for room in self.rooms:
+                room.draw(view)
+
+        # Рисуем сцену (игрока, NPC и др.)
+        with profiler.measure("draw.scene"):
+            self.scene.draw()
+
+        with profiler.measure("draw.text"):
+            # Диалоги NPC и подсказка - объекты Text в одном батче
+            for npc in self.npcs:
+                npc.update_dialog_text(self.text_batch)
+            self.update_prompt_text()
+            self.text_batch.draw()
+
+            # Если игра окончена, рисуем текст проигрыша
+            if self.game_over and self.game_over_text:
+                self.game_over_text.draw()
+
+    def update_prompt_text(self):
+        """Подсказка для взаимодействия, если игрок рядом с NPC"""
+        visible = bool(self.near_npc and not self.near_npc.dialog_active and self.player.is_alive)
+        if self.prompt_text is None:
+            if not visible:
+                return
+            self.prompt_text = arcade.Text(
                 "Нажмите E для разговора",
-                self.player.center_x,
-                self.player.center_y + 50,
+                0, 0,
                 arcade.color.WHITE, 12,
                 anchor_x="center",
-                anchor_y="center"
+                anchor_y="center",
+                batch=self.text_batch,
             )
 
-        # Если игра окончена, рисуем текст проигрыша
-        if self.game_over and self.game_over_text:
-            self.game_over_text.draw()
+        if self.prompt_text.visible != visible:
+            self.prompt_text.visible = visible
+        if visible:
+            position = (self.player.center_x, self.player.center_y + 50)
+            if self.prompt_text.position != position:
+                self.prompt_text.position = position
+
+    def draw_profiler(self):
+        """Оверлей с замерами в экранных координатах, текст обновляется 4 раза в секунду"""
+        if self.profiler_text is None or self.profiler.frames % 15 == 0:
+            self.profiler_batch = Batch()
+            self.profiler_text = arcade.Text(
+                "\n".join(self.profiler.report()),
+                10, self.window.height - 10,
+                arcade.color.WHITE, 10,
+                anchor_y="top",
+                multiline=True,
+                width=self.window.width - 20,
+                font_name=("Courier New", "Courier", "monospace"),
+                batch=self.profiler_batch,
+            )
+        self.window.default_camera.use()
+        self.profiler_batch.draw()
 
     def on_update(self, delta_time):
+        # Ввод из записи - до проверки game_over: в нём бывает ENTER для перезапуска
+        if self.replay is not None:
+            self.apply_replay_events()
+            if self.game_over and self.tick >= self.replay.end_tick:
+                self.replay = None  # Запись кончилась смертью, дальше клавиатура
         if not self.physics_engine or self.game_over:
             return
 
-        self.physics_engine.update()
+        self.accumulator += delta_time
+        steps = 0
+        with self.profiler.measure("update"):
+            while self.accumulator >= FIXED_STEP and not self.game_over:
+                if steps == self.max_catch_up:
+                    # Не успеваем: отбрасываем долг, а не копим его
+                    self.accumulator %= FIXED_STEP
+                    break
+                if self.replay is not None:
+                    self.apply_replay_events()
+                self.prev_player_position = self.player.position
+                self.prev_camera_position = self.camera.position
+                self.update_world(FIXED_STEP)
+                self.tick += 1
+                self.accumulator -= FIXED_STEP
+                steps += 1
+
+        self.render_alpha = self.accumulator / FIXED_STEP
+
+        if self.replay is not None and self.tick >= self.replay.end_tick:
+            self.replay = None  # Запись кончилась, дальше управляет игрок
+
+    def update_world(self, delta_time):
+        profiler = self.profiler
+
+        # Достраиваем комнаты рядом с игроком до шага физики
+        with profiler.measure("update.streaming"):
+            if self.room_streamer.update(self.player.center_x, self.player.center_y):
+                self.refresh_rooms()
+
+        with profiler.measure("update.physics"):
+            self.physics_engine.update()
 
         # Проверяем близость к NPC
-        self.check_npc_proximity()
+        with profiler.measure("update.npc"):
+            self.check_npc_proximity()
 
         # Проверяем столкновения с врагами и пулями
-        self.check_collisions()
-
-        # Обновляем врагов и их стрельбу
-        for room in self.rooms:
-            room.update_enemies(delta_time, self.player.center_x, self.player.center_y)
-            room.update_bullets()
-
-        if self.player.is_alive:
-            if self.left_pressed and not self.right_pressed:
-                self.player.move("left")
-            elif self.right_pressed and not self.left_pressed:
-                self.player.move("right")
-            else:
-                self.player.stop()
+        with profiler.measure("update.collisions"):
+            self.check_collisions()
+
+        # Обновляем врагов и их стрельбу в активных комнатах
+        self.room_scheduler.update(self.current_room, delta_time,
+                                   self.player.center_x, self.player.center_y, profiler)
+
+        with profiler.measure("update.player"):
+            if self.player.is_alive:
+                if self.left_pressed and not self.right_pressed:
+                    self.player.move("left")
+                elif self.right_pressed and not self.left_pressed:
+                    self.player.move("right")
+                else:
+                    self.player.stop()
 
-            self.player.sprint(self.shift_pressed)
-            self.player.update()
+                self.player.sprint(self.shift_pressed)
+                self.player.update()
 
         # Определяем, в какой комнате находится игрок
-        for room in self.rooms:
-            if room.contains_point(self.player.center_x, self.player.center_y):
-                self.current_room = room
-                break
+        with profiler.measure("update.room_lookup"):
+            for room in self.rooms:
+                if room.contains_point(self.player.center_x, self.player.center_y):
+                    self.current_room = room
+                    break
 
-        if self.current_room == self.room1:
+        if self.current_room is None:
+            pass
+        elif self.current_room == self.room1:
             if self.player.center_x in [i for i in range(375, 425)] and self.player.center_y in [i for i in range(200, 250)]:
                 self.player.center_x = 2025
                 self.player.center_y = 5200
         elif self.current_room == self.room2:
             if self.player.center_x in [i for i in range(1700, 2300)] and self.player.center_y in [i for i in range(5000, 5250)]:
                 if self.game_over:
-                    self.window.show_view(LoseWindow())
+                    self.window.show_view(LoseWindow(self))
                 else:
-                    self.window.show_view(WinWindow())
-                    #починить окно победы
-                    print('победа')
+                    self.win()
 
-        self.center_camera_to_player()
+        with profiler.measure("update.camera"):
+            self.center_camera_to_player()
 
     def on_key_press(self, key, modifiers):
+        if key == arcade.key.F3:
+            self.show_profiler = not self.show_profiler
+            return
+        if self.replay is not None:
+            return  # При повторе ввод берётся из записи
+        if self.recorder is not None:
+            self.recorder.record(self.tick, key, True)
+        self.handle_key_press(key)
+
+    def handle_key_press(self, key):
         if self.game_over:
             if key == arcade.key.ENTER:
                 # Перезапуск игры
-                self.setup()
+                self.restart()
+            elif key == arcade.key.F9 and self.checkpoint is not None:
+                self.restore(self.checkpoint)
             return
 
         if key == arcade.key.A:
@@ -879,6 +2198,10 @@ class MyGame(arcade.View):
             self.shift_pressed = True
         elif key == arcade.key.E and self.near_npc:
             self.near_npc.interact()
+        elif key == arcade.key.F5:
+            self.checkpoint = self.snapshot()
+        elif key == arcade.key.F9 and self.checkpoint is not None:
+            self.restore(self.checkpoint)
         elif key == arcade.key.ESCAPE:
             if self.pause_fl:
                 self.player.speed = 3
@@ -889,6 +2212,13 @@ class MyGame(arcade.View):
                 #дописать чтобы у противников тоже пропадала скорость
 
     def on_key_release(self, key, modifiers):
+        if key == arcade.key.F3 or self.replay is not None:
+            return
+        if self.recorder is not None:
+            self.recorder.record(self.tick, key, False)
+        self.handle_key_release(key)
+
+    def handle_key_release(self, key):
         if key == arcade.key.A:
             self.left_pressed = False
         elif key == arcade.key.D:
@@ -898,11 +2228,27 @@ class MyGame(arcade.View):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Echo of the Void")
+    parser.add_argument("--telemetry", help="писать время кадров в файл .jsonl или .csv")
+    parser.add_argument("--record", help="записать ввод и seed в файл для повтора")
+    parser.add_argument("--replay", help="повторить запись вместо ввода с клавиатуры")
+    args = parser.parse_args()
+
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, "Echo of the Void")
     game_view = MyGame()
+    if args.telemetry:
+        game_view.start_telemetry(args.telemetry)
+    if args.replay:
+        game_view.start_replay(Replay.load(args.replay))
+    elif args.record:
+        game_view.start_recording(args.record)
     start_view = StartView(game_view)
     window.show_view(start_view)
-    arcade.run()
+    try:
+        arcade.run()
+    finally:
+        game_view.stop_recording()
+        game_view.stop_telemetry()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+"""Физика платформера для неподвижной геометрии уровня.
+
+Шаг повторяет arcade.PhysicsEnginePlatformer (гравитация, сдвиг по y,
+затем по x с подъёмом на ступеньки), поэтому прыжок и падение ощущаются
+так же. Разница в поиске препятствий: стены и платформы один раз при
+добавлении комнаты раскладываются по сетке, а за тик проверяются только
+те, что лежат в ячейках под областью, которую игрок может задеть.
+
+Подвижных платформ и лестниц в игре нет, движок их не поддерживает.
+"""
+import math
+
+import arcade
+
+CELL_SIZE = 128
+
+
+class StaticGrid:
+    """Сетка неподвижных спрайтов: спрайт лежит во всех ячейках, которые задевает"""
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> [спрайт, ...]
+        self.sprite_cells = {}
+        self.rects = {}  # спрайт -> (left, right, bottom, top) на момент добавления
+
+    def cell_range(self, left, right, bottom, top):
+        size = self.cell_size
+        return int(left // size), int(right // size), int(bottom // size), int(top // size)
+
+    def add(self, sprite):
+        rect = sprite.left, sprite.right, sprite.bottom, sprite.top
+        self.rects[sprite] = rect
+        x0, x1, y0, y1 = self.cell_range(*rect)
+        cells = [(i, j) for i in range(x0, x1 + 1) for j in range(y0, y1 + 1)]
+        self.sprite_cells[sprite] = cells
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(sprite)
+
+    def remove(self, sprite):
+        self.rects.pop(sprite, None)
+        for cell in self.sprite_cells.pop(sprite, ()):
+            bucket = self.cells[cell]
+            bucket.remove(sprite)
+            if not bucket:
+                del self.cells[cell]
+
+    def query(self, left, right, bottom, top):
+        """Спрайты из ячеек под прямоугольником, без повторов"""
+        x0, x1, y0, y1 = self.cell_range(left, right, bottom, top)
+        found = {}
+        for i in range(x0, x1 + 1):
+            for j in range(y0, y1 + 1):
+                bucket = self.cells.get((i, j))
+                if bucket:
+                    for sprite in bucket:
+                        found[sprite] = None
+        return list(found)
+
+
+class PlatformerPhysics:
+    def __init__(self, player_sprite, gravity_constant=0.5, cell_size=CELL_SIZE):
+        self.player_sprite = player_sprite
+        self.gravity_constant = gravity_constant
+        self.grid = StaticGrid(cell_size)
+        self.walls = []  # Добавленные списки препятствий
+
+    def add_walls(self, sprites):
+        """Кладёт препятствия в сетку, их нельзя двигать, пока они добавлены"""
+        self.walls.append(sprites)
+        for sprite in sprites:
+            self.grid.add(sprite)
+
+    def remove_walls(self, sprites):
+        self.walls.remove(sprites)
+        for sprite in sprites:
+            self.grid.remove(sprite)
+
+    def nearby(self, sprite, margin=0):
+        return self.grid.query(sprite.left - margin, sprite.right + margin,
+                               sprite.bottom - margin, sprite.top + margin)
+
+    def hits(self, sprite, candidates):
+        """Препятствия, которые задевает спрайт: сначала прямоугольники, потом точная проверка arcade"""
+        left, right, bottom, top = sprite.left, sprite.right, sprite.bottom, sprite.top
+        rects = self.grid.rects
+        result = []
+        for wall in candidates:
+            wall_left, wall_right, wall_bottom, wall_top = rects[wall]
+            if wall_left > right or wall_right < left or wall_bottom > top or wall_top < bottom:
+                continue
+            if arcade.check_for_collision(sprite, wall):
+                result.append(wall)
+        return result
+
+    def can_jump(self, y_distance=5):
+        """Стоит ли игрок на чём-то (проверка, как в arcade: опускаем на y_distance)"""
+        player = self.player_sprite
+        player.center_y -= y_distance
+        on_ground = bool(self.hits(player, self.nearby(player)))
+        player.center_y += y_distance
+        return on_ground
+
+    def update(self):
+        """Гравитация и сдвиг игрока, возвращает препятствия, которых он коснулся"""
+        player = self.player_sprite
+        player.change_y -= self.gravity_constant
+
+        # Начали шаг внутри стены - выталкиваем, как arcade
+        if self.hits(player, self.nearby(player)):
+            self.wiggle_until_free(player)
+
+        # За шаг игрок сдвинется не дальше скорости по x (и подъёма на ступеньку) и по y
+        reach = abs(player.change_x) + abs(player.change_y) + 2
+        return self.move(player, self.nearby(player, reach))
+
+    def wiggle_until_free(self, sprite):
+        """Пробует точки вокруг всё дальше, пока спрайт не перестанет задевать стены"""
+        o_x, o_y = sprite.position
+        wiggle = 1
+        while True:
+            for x, y in ((o_x, o_y + wiggle), (o_x, o_y - wiggle),
+                         (o_x + wiggle, o_y), (o_x - wiggle, o_y),
+                         (o_x + wiggle, o_y + wiggle), (o_x + wiggle, o_y - wiggle),
+                         (o_x - wiggle, o_y + wiggle), (o_x - wiggle, o_y - wiggle)):
+                sprite.position = x, y
+                if not self.hits(sprite, self.nearby(sprite)):
+                    return
+            wiggle *= 2
+
+    def move(self, sprite, candidates):
+        """Сдвиг по y, затем по x с подъёмом на ступеньки (порядок и шаги как в arcade)"""
+        original_x, original_y = sprite.position
+
+        # --- По y
+        sprite.center_y += sprite.change_y
+        hit_list = self.hits(sprite, candidates)
+        complete_hit_list = hit_list
+        if hit_list:
+            if sprite.change_y > 0:
+                while self.hits(sprite, candidates):
+                    sprite.center_y -= 1
+            elif sprite.change_y < 0:
+                for item in hit_list:
+                    while arcade.check_for_collision(sprite, item):
+                        sprite.center_y += 0.25
+            sprite.change_y = 0.0
+        sprite.center_y = round(sprite.center_y, 2)
+
+        # --- По x: двоичный поиск наибольшего свободного сдвига
+        if not sprite.change_x:
+            return complete_hit_list
+
+        almost_original_y = sprite.center_y
+        direction = math.copysign(1, sprite.change_x)
+        cur_x_change = abs(sprite.change_x)
+        upper_bound = cur_x_change
+        lower_bound = 0
+        cur_y_change = 0
+        exit_loop = False
+        while not exit_loop:
+            sprite.center_x = original_x + cur_x_change * direction
+            collision_check = self.hits(sprite, candidates)
+            for item in collision_check:
+                if item not in complete_hit_list:
+                    complete_hit_list.append(item)
+
+            if collision_check:
+                # Упёрлись: может, получится подняться на ступеньку
+                cur_y_change = cur_x_change
+                sprite.center_y = original_y + cur_y_change
+                collision_check = self.hits(sprite, candidates)
+                if collision_check:
+                    cur_y_change -= cur_x_change
+                else:
+                    while not collision_check and cur_y_change > 0:
+                        cur_y_change -= 1
+                        sprite.center_y = almost_original_y + cur_y_change
+                        collision_check = self.hits(sprite, candidates)
+                    cur_y_change += 1
+                    collision_check = []
+
+                if collision_check:
+                    upper_bound = cur_x_change - 1
+                    if upper_bound - lower_bound <= 0:
+                        cur_x_change = lower_bound
+                        exit_loop = True
+                    else:
+                        cur_x_change = (upper_bound + lower_bound) // 2
+                else:
+                    exit_loop = True
+            else:
+                lower_bound = cur_x_change
+                if upper_bound - lower_bound <= 0:
+                    exit_loop = True
+                else:
+                    cur_x_change = (upper_bound + lower_bound) // 2 + (upper_bound + lower_bound) % 2
+
+        sprite.position = original_x + cur_x_change * direction, almost_original_y + cur_y_change
+        return complete_hit_list
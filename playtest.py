@@ -0,0 +1,429 @@
+"""Массовые прогоны ботом сгенерированных комнат на нескольких ядрах.
+
+Каждый seed - отдельная комната, которую бот проходит снизу вверх в
+HeadlessGame. Прогоны независимы и раздаются пулу процессов, поэтому
+скорость растёт с числом ядер. Для каждого seed в файл пишется исход
+(exit, lose, timeout), причина смерти из check_collisions, время до
+выхода, высшая точка и проходимость по графу прыжков (reachability.py),
+в конце печатается сводка. Бот идёт по кратчайшему пути графа, а где
+прыжок не выходит - пробует случайные платформы.
+
+    python playtest.py --seeds 0:2000 --jobs 8 --out playtest.csv
+    python playtest.py --seeds 0:500 --height 2000 --step-y 140 --peaceful
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import random
+import statistics
+import time
+from collections import deque
+
+import arcade
+
+from headless import FIXED_DELTA, HeadlessGame
+from main import LAYOUT_CACHE, Player, RoomLayout
+from physics import PlatformerPhysics
+from reachability import LANDING_MARGIN, JumpArc
+
+ROOM_X = 4000  # Подальше от телепорта первой комнаты MyGame
+JUMP_RISE = JumpArc().max_rise - LANDING_MARGIN  # На сколько прыжок поднимает ноги, с запасом
+EXIT_MARGIN = 250  # Выход - подняться выше потолка минус этот отступ
+STALL_TICKS = 900  # Столько тиков без нового рекорда высоты - бот застрял
+SPOT_SEARCH = 60  # Насколько место прыжка можно сдвигать под цель
+WANDER_BLOCKED_TICKS = 10  # Столько тиков без сдвига в одну сторону - разворачиваемся
+MAX_TARGETS = 6  # Сколько платформ пробуем за один поиск плана
+MAX_ROLLOUTS = 27  # Сколько прыжков копии проигрываем на одну цель
+MAX_APPROACH_TICKS = 60
+MAX_FLIGHT_TICKS = 150
+DEAD_END_FAILURES = 2  # После стольких неудачных поисков с платформы она - тупик
+DETOUR_DEPTH = 300  # Насколько ниже опоры ищем платформы для обхода тупика
+REPLAN_TICKS = 30  # После неудачного поиска столько тиков бродим без плана
+# Как рулить в прыжке: столько тиков держим направление, дальше рулим на цель
+FLIGHT_POLICIES = ((0, 0),) + tuple((first, ticks) for ticks in (6, 12, 18, 24) for first in (1, -1))
+
+FIELDS = ("seed", "outcome", "death_reason", "ticks", "time_to_exit", "max_height", "graph_exit",
+          "wall_time")
+
+
+class PlaytestGame(HeadlessGame):
+    """Уровень из одной комнаты: старт у пола, выход под потолком"""
+
+    NPC_SPECS = ()
+
+    def __init__(self, seed, width=600, height=5000, peaceful=False):
+        self.peaceful = peaceful
+        self.ROOM_SPECS = (dict(x=ROOM_X, y=100 + height // 2, width=width, height=height),)
+        self.PLAYER_START = (ROOM_X, 200)
+        self.exit_y = 100 + height - EXIT_MARGIN
+        super().__init__()
+        self.level_seed = seed
+
+    def setup(self):
+        super().setup()
+        if self.peaceful:
+            # Без врагов проверяется только, проходима ли раскладка платформ
+            for room in self.rooms:
+                room.enemies.clear()
+                room.index_enemies()
+            self.start_snapshot = self.snapshot()
+
+    def step(self, delta_time=FIXED_DELTA):
+        super().step(delta_time)
+        if not self.game_over and self.player.center_y >= self.exit_y:
+            self.game_over = True
+            self.outcome = "exit"
+
+
+class ClimbBot:
+    """Лезет вверх: выбирает платформу в пределах прыжка и, прежде чем
+    прыгать, проигрывает подход и прыжок на копии игрока в той же физике.
+    Исполняется первый план, который приводит на цель"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.held = set()
+        self.target = None
+        self.plan = deque()  # (направление, прыжок) на следующие тики
+        self.replan_tick = 0  # Раньше этого тика план не ищем - после неудачи бродим
+        self.wander = 1  # Куда идти, когда подходящей платформы нет
+        self.last_x = None
+        self.last_direction = 0
+        self.blocked = 0  # Сколько тиков подряд идём в wander и не сдвигаемся
+        self.failures = {}  # Платформа -> сколько раз с неё не нашёлся прыжок выше
+        self.ghost = None  # Копия игрока со своей физикой для проигрывания планов
+        self.ghost_room = None
+
+    def reachable(self, platform, feet):
+        return feet + 10 < platform.top < feet + JUMP_RISE
+
+    def dead_end(self, platform):
+        # Поиск плана случайный, поэтому тупик - только после нескольких неудач
+        return self.failures.get(platform, 0) >= DEAD_END_FAILURES
+
+    def detours(self, game, feet):
+        """Платформы вбок и вниз, чтобы обойти тупик, в случайном порядке"""
+        standing = self.standing_on(game)
+        detours = [platform for platform in game.current_room.platforms
+                   if feet - DETOUR_DEPTH < platform.top <= feet + 10
+                   and platform is not standing and not self.dead_end(platform)]
+        self.rng.shuffle(detours)
+        return detours[:MAX_TARGETS]
+
+    def targets(self, game, feet):
+        """Первым - следующий прыжок кратчайшего пути графа, дальше случайные
+        платформы в пределах прыжка, выше - вероятнее"""
+        room = game.current_room
+        graph = room.layout.graph
+        node = graph.node_at(game.player.center_x, feet, tolerance=8)
+        path = graph.path(node, graph.exit) if node is not None else None
+        first = None
+        if path and len(path) > 1 and path[1] != graph.floor:
+            first = room.platforms[path[1]]
+
+        # Тупики пропускаем: с них уже не нашлось прыжка выше
+        others = [platform for platform in room.platforms
+                  if platform is not first and not self.dead_end(platform) and self.reachable(platform, feet)]
+        others.sort(key=lambda platform: self.rng.random() ** (1 / (platform.top - feet)), reverse=True)
+        if first is not None and not self.dead_end(first) and self.reachable(first, feet):
+            others.insert(0, first)
+        return others[:MAX_TARGETS]
+
+    def standing_on(self, game):
+        """Платформа под игроком, None - пол или воздух"""
+        player = game.player
+        for platform in game.current_room.platforms:
+            if -3 < player.bottom - platform.top < 6 and platform.left < player.right and platform.right > player.left:
+                return platform
+        return None
+
+    def support(self, game):
+        """Отрезок по x, где может стоять центр игрока на текущей опоре"""
+        player = game.player
+        room = game.current_room
+        if -3 < player.bottom - room.bottom < 6:
+            return room.left, room.right
+        platform = self.standing_on(game)
+        if platform is not None:
+            return platform.left, platform.right
+        return player.center_x, player.center_x
+
+    def spots(self, game, target):
+        """Места прыжка на текущей опоре: сбоку от цели и со сдвигом под её край"""
+        player = game.player
+        room = game.current_room
+        half = (player.right - player.left) / 2  # width отрицательна, когда игрок смотрит влево
+        reach = player.bottom + JUMP_RISE - target.top  # Запас высоты над целью - столько же пролетим вбок
+        low, high = self.support(game)
+        low, high = max(low, room.left + half) + 2, min(high, room.right - half) - 2
+        sides = sorted(((target.left - half - 8, 1), (target.right + half + 8, -1)),
+                       key=lambda side: abs(side[0] - player.center_x))
+        spots = []
+        for shift in range(0, SPOT_SEARCH, 12):
+            for start, inward in sides:
+                x = min(max(start + shift * inward, low), high)
+                if x + half < target.left - reach or x - half > target.right + reach:
+                    continue  # Слишком далеко сбоку
+                if all(abs(x - spot) >= 6 for spot in spots):
+                    spots.append(x)
+        return spots
+
+    def ghost_for(self, game):
+        """Копия игрока в его текущем состоянии, стены - только текущей комнаты"""
+        room = game.current_room
+        if self.ghost_room is not room:
+            ghost = Player()
+            ghost.world_width = game.player.world_width
+            engine = PlatformerPhysics(ghost, gravity_constant=game.physics_engine.gravity_constant)
+            engine.add_walls(room.get_collision_sprites())
+            ghost.setup_physics(engine)
+            self.ghost = ghost
+            self.ghost_room = room
+        self.ghost.restore_state(game.player.save_state())
+        return self.ghost
+
+    @staticmethod
+    def tick(ghost, direction, jump):
+        """Шаг копии в том же порядке, что MyGame: прыжок по нажатию, физика, ходьба, Player.update"""
+        if jump:
+            ghost.jump()
+        ghost.physics_engine.update()
+        if direction > 0:
+            ghost.move("right")
+        elif direction < 0:
+            ghost.move("left")
+        else:
+            ghost.stop()
+        ghost.update()
+
+    def approach(self, ghost, spot):
+        """Подводит копию к spot по опоре, возвращает действия или None"""
+        actions = []
+        while abs(ghost.center_x - spot) > 4:
+            if len(actions) >= MAX_APPROACH_TICKS or not ghost.can_jump:
+                return None  # Не дошли или упали с опоры
+            direction = 1 if ghost.center_x < spot else -1
+            actions.append((direction, False))
+            self.tick(ghost, direction, False)
+        if not ghost.can_jump or ghost.change_y != 0:
+            return None
+        return actions
+
+    def fly(self, ghost, target, first, steer_ticks):
+        """Прыжок копии: steer_ticks тиков держим first, дальше рулим на цель.
+        Возвращает действия, если копия приземлилась на цель"""
+        actions = []
+        for i in range(MAX_FLIGHT_TICKS):
+            if i < steer_ticks:
+                direction = first
+            elif ghost.bottom < target.top - 2:
+                # Ниже цели: из-под её края уходим в сторону, иначе просто поднимаемся
+                if ghost.left < target.right and ghost.right > target.left:
+                    direction = -1 if ghost.center_x < target.center_x else 1
+                else:
+                    direction = 0
+            elif not target.left + 10 < ghost.center_x < target.right - 10:
+                direction = 1 if ghost.center_x < target.center_x else -1
+            else:
+                direction = 0  # Над серединой цели - падаем на неё
+            actions.append((direction, i == 0))
+            self.tick(ghost, direction, i == 0)
+            if i > 0 and ghost.can_jump and ghost.change_y == 0:
+                landed = abs(ghost.bottom - target.top) < 2 and target.left < ghost.center_x < target.right
+                return actions if landed else None
+        return None
+
+    def make_plan(self, game, targets):
+        """Первые подход и прыжок, которые на копии приводят на одну из целей"""
+        ghost = self.ghost_for(game)
+        start = ghost.save_state()
+        for target in targets:
+            rollouts = 0
+            for spot in self.spots(game, target):
+                ghost.restore_state(start)
+                approach = self.approach(ghost, spot)
+                if approach is None:
+                    continue
+                takeoff = ghost.save_state()
+                for first, steer_ticks in FLIGHT_POLICIES:
+                    ghost.restore_state(takeoff)
+                    flight = self.fly(ghost, target, first, steer_ticks)
+                    if flight is not None:
+                        self.target = target
+                        return deque(approach + flight)
+                    rollouts += 1
+                if rollouts >= MAX_ROLLOUTS:
+                    break  # Эта цель не выходит, пробуем следующую
+        return deque()
+
+    def wander_direction(self, game):
+        """Без плана идём в одну сторону до стены, падая с платформ"""
+        player = game.player
+        room = game.current_room
+        if player.left < room.left + 10:
+            self.wander = 1
+        elif player.right > room.right - 10:
+            self.wander = -1
+        elif self.last_direction == self.wander and (player.center_x - self.last_x) * self.wander < 1:
+            # Первый тик после разворота тоже стоит на месте: движок сдвигает игрока
+            # прежней скоростью, Player.update - новой, поэтому ждём несколько тиков
+            self.blocked += 1
+            if self.blocked >= WANDER_BLOCKED_TICKS:
+                self.wander = -self.wander  # Упёрлись в край платформы сбоку
+                self.blocked = 0
+        else:
+            self.blocked = 0
+        return self.wander
+
+    def keys(self, game):
+        """События клавиш на этот тик: [(клавиша, нажата), ...]"""
+        player = game.player
+        on_ground = player.can_jump and player.change_y == 0
+        if not self.plan and on_ground and game.tick >= self.replan_tick:
+            self.plan = self.make_plan(game, self.targets(game, player.bottom))
+            if not self.plan:
+                # Выше отсюда не прыгнуть: запоминаем тупик и уходим с него вбок или вниз
+                platform = self.standing_on(game)
+                if platform is not None:
+                    self.failures[platform] = self.failures.get(platform, 0) + 1
+                self.plan = self.make_plan(game, self.detours(game, player.bottom))
+            if not self.plan:
+                self.target = None
+                if platform is None:
+                    self.failures.clear()  # С пола идти некуда - пробуем все платформы заново
+                self.replan_tick = game.tick + REPLAN_TICKS
+
+        if self.plan:
+            direction, jump = self.plan.popleft()
+        else:
+            direction, jump = self.wander_direction(game), False
+
+        self.last_x = player.center_x
+        self.last_direction = direction
+        wanted = set()
+        if direction:
+            wanted.add(arcade.key.D if direction > 0 else arcade.key.A)
+        events = [(key, False) for key in self.held - wanted]
+        events += [(key, True) for key in wanted - self.held]
+        self.held = wanted
+
+        # Прыжок - нажатие и сразу отпускание
+        if jump:
+            events += [(arcade.key.SPACE, True), (arcade.key.SPACE, False)]
+        return events
+
+
+def play(seed, width=600, height=5000, max_ticks=20000, peaceful=False):
+    """Один прогон бота по комнате seed, возвращает строку результатов"""
+    start = time.perf_counter()
+    game = PlaytestGame(seed, width, height, peaceful)
+    game.setup()
+    bot = ClimbBot(seed)
+
+    max_height = game.player.bottom
+    best_tick = 0
+    while not game.game_over and game.tick < max_ticks:
+        for key, pressed in bot.keys(game):
+            if pressed:
+                game.on_key_press(key, 0)
+            else:
+                game.on_key_release(key, 0)
+        game.step()
+
+        if game.player.bottom > max_height + 1:
+            max_height = game.player.bottom
+            best_tick = game.tick
+        elif game.tick - best_tick > STALL_TICKS:
+            break
+
+    # Комнаты seed больше не встретятся: без этого кэш раскладок растёт весь прогон воркера
+    LAYOUT_CACHE.clear()
+
+    outcome = game.outcome or "timeout"
+    return {
+        "seed": seed,
+        "outcome": outcome,
+        "death_reason": game.death_reason or "",
+        "ticks": game.tick,
+        "time_to_exit": round(game.tick * FIXED_DELTA, 2) if outcome == "exit" else "",
+        "max_height": round(max_height - game.current_room.bottom),
+        "graph_exit": int(game.current_room.layout.graph.exit_reachable()),
+        "wall_time": round(time.perf_counter() - start, 3),
+    }
+
+
+def init_worker(step_y, max_x_offset):
+    RoomLayout.PLATFORM_STEP_Y = step_y
+    RoomLayout.PLATFORM_MAX_X_OFFSET = max_x_offset
+
+
+def play_args(args):
+    return play(*args)
+
+
+def parse_seeds(text):
+    """"0:1000" - диапазон, "1,5,9" - список"""
+    if ":" in text:
+        first, last = text.split(":")
+        return list(range(int(first), int(last)))
+    return [int(seed) for seed in text.split(",")]
+
+
+def summary(rows, elapsed):
+    lines = []
+    total = len(rows)
+    exits = [row for row in rows if row["outcome"] == "exit"]
+    lines.append(f"rooms: {total}, {total / elapsed:.1f}/s")
+    lines.append(f"completion: {len(exits) / total:.1%}")
+
+    outcomes = {}
+    for row in rows:
+        name = row["death_reason"] or row["outcome"]
+        outcomes[name] = outcomes.get(name, 0) + 1
+    for name, count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        lines.append(f"  {name}: {count} ({count / total:.1%})")
+
+    passable = sum(row["graph_exit"] for row in rows)
+    lines.append(f"exit reachable by jump graph: {passable / total:.1%}")
+
+    if exits:
+        times = [row["time_to_exit"] for row in exits]
+        lines.append(f"time to exit: median {statistics.median(times):.1f} s, "
+                     f"max {max(times):.1f} s")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot playtests of generated rooms")
+    parser.add_argument("--seeds", default="0:100", help='диапазон "0:1000" или список "1,5,9"')
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--width", type=int, default=600)
+    parser.add_argument("--height", type=int, default=5000)
+    parser.add_argument("--max-ticks", type=int, default=20000)
+    parser.add_argument("--step-y", type=int, default=RoomLayout.PLATFORM_STEP_Y)
+    parser.add_argument("--max-x-offset", type=int, default=RoomLayout.PLATFORM_MAX_X_OFFSET)
+    parser.add_argument("--peaceful", action="store_true", help="убрать врагов из комнат")
+    parser.add_argument("--out", default="playtest.csv", help="файл результатов по seed")
+    args = parser.parse_args()
+
+    seeds = parse_seeds(args.seeds)
+    tasks = [(seed, args.width, args.height, args.max_ticks, args.peaceful) for seed in seeds]
+
+    start = time.perf_counter()
+    rows = []
+    with multiprocessing.Pool(args.jobs, init_worker, (args.step_y, args.max_x_offset)) as pool, \
+            open(args.out, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        for row in pool.imap_unordered(play_args, tasks):
+            writer.writerow(row)
+            rows.append(row)
+    elapsed = time.perf_counter() - start
+
+    print("\n".join(summary(rows, elapsed)))
+    print(f"results: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
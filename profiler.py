@@ -0,0 +1,102 @@
+"""Замер времени фаз кадра.
+
+    profiler = FrameProfiler()
+    with profiler.measure("update.physics"):
+        physics_engine.update()
+    profiler.end_frame()
+
+end_frame() закрывает кадр: добавляет время фаз в скользящие окна и
+передаёт словарь {фаза: секунды} подписчикам из add_listener. Фаза
+"frame" - полное время между двумя end_frame.
+"""
+import time
+from collections import deque
+
+FRAME_BUDGET = 1 / 60
+
+
+class _Measure:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class FrameProfiler:
+    def __init__(self, window=120):
+        self.window = window
+        self.samples = {}  # фаза -> deque последних значений в секундах
+        self.current = {}
+        self.listeners = []
+        self.frame_start = time.perf_counter()
+        self.frames = 0
+
+        # Последний кадр, не уложившийся в бюджет
+        self.last_slow_frame = None
+
+    def measure(self, name):
+        return _Measure(self, name)
+
+    def add(self, name, seconds):
+        """Добавляет время к фазе текущего кадра (повторные замеры суммируются)"""
+        self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self.listeners.remove(callback)
+
+    def end_frame(self):
+        now = time.perf_counter()
+        frame = self.current
+        frame["frame"] = now - self.frame_start
+        self.frame_start = now
+        self.current = {}
+        self.frames += 1
+
+        for name, seconds in frame.items():
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+        if frame["frame"] > FRAME_BUDGET:
+            self.last_slow_frame = frame
+
+        for callback in self.listeners:
+            callback(frame)
+
+    def stats(self):
+        """{фаза: (среднее, p99, последнее)} в секундах по скользящему окну"""
+        result = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            result[name] = (sum(ordered) / len(ordered), p99, samples[-1])
+        return result
+
+    def report(self):
+        """Строки для оверлея: фазы по убыванию среднего времени"""
+        lines = [f"{'phase':<20}{'avg':>8}{'p99':>8} ms"]
+        stats = self.stats()
+        for name, (avg, p99, _) in sorted(stats.items(), key=lambda item: -item[1][0]):
+            lines.append(f"{name:<20}{avg * 1000:8.2f}{p99 * 1000:8.2f}")
+
+        slow = self.last_slow_frame
+        if slow:
+            phases = [(name, seconds) for name, seconds in slow.items()
+                      if name not in ("frame", "update", "draw")]
+            # Время вне update/draw (ожидание vsync, события окна, загрузка)
+            phases.append(("other", slow["frame"] - slow.get("update", 0.0) - slow.get("draw", 0.0)))
+            if phases:
+                worst, seconds = max(phases, key=lambda item: item[1])
+                lines.append(f"slow frame {slow['frame'] * 1000:.1f} ms: {worst} {seconds * 1000:.1f} ms")
+        return lines
@@ -0,0 +1,159 @@
+"""Граф достижимости платформ комнаты по дуге прыжка.
+
+Дуга считается тем же шагом, что и в игре: движок гасит скорость
+гравитацией и сдвигает игрока, затем Player.update сдвигает его ещё
+раз, поэтому за тик игрок проходит две скорости. Ребро A -> B есть,
+если с опоры A прыжок поднимает ноги над B и к моменту спуска на её
+высоту игрок успевает пролететь зазор между ними по x.
+
+    graph = PlatformGraph(layout.platforms, layout.left, layout.right, layout.bottom)
+    graph.exit_reachable()          # можно ли с пола добраться до верхней платформы
+    graph.path(graph.floor, 17)     # кратчайший по числу прыжков путь
+
+Другие платформы на пути прыжка не учитываются, поэтому граф
+оптимистичен: ребро значит "дуга позволяет", а не "точно пролетит".
+Спуски глубже высоты прыжка в граф не входят - при падении игрок всё
+равно проходит через платформы между ними.
+"""
+import math
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+MOVES_PER_TICK = 2  # Движок и Player.update сдвигают игрока за тик дважды
+PLAYER_SIZE = 36  # Хитбокс игрока по x и y
+LANDING_MARGIN = 10  # Запас по высоте, чтобы не цепляться за самый край платформы
+
+
+class JumpArc:
+    """Высота ног над точкой прыжка по тикам и горизонтальная дальность"""
+
+    def __init__(self, jump_speed=12, gravity=0.5, speed=3):
+        # Значения по умолчанию - как у Player и PlatformerPhysics
+        self.step_x = speed * MOVES_PER_TICK
+
+        # Тики до вершины и обратно до глубины, равной высоте прыжка
+        heights = []
+        y = peak = 0
+        change_y = jump_speed
+        while change_y > 0 or y > -peak:
+            change_y -= gravity
+            y += change_y * MOVES_PER_TICK
+            peak = max(peak, y)
+            heights.append(y)
+        self.max_rise = peak
+        self.apex_tick = heights.index(peak)
+        self.descent = [-h for h in heights[self.apex_tick:]]  # По возрастанию, для bisect
+
+        # Дальность для целых высот от -max_rise до max_rise (-1 - не допрыгнуть),
+        # чтобы граф не звал bisect
+        self.offset = math.ceil(peak)
+        self.reach_table = [-1 if reach is None else reach
+                            for reach in map(self.reach, range(-self.offset, self.offset + 1))]
+
+    def ticks_to_land(self, height):
+        """Сколько тиков ноги не ниже height (на спуске), None - не допрыгнуть"""
+        if height > self.max_rise:
+            return None
+        return self.apex_tick + bisect_right(self.descent, -height)
+
+    def reach(self, height):
+        """Сколько можно пролететь по x, приземляясь на height выше точки прыжка"""
+        ticks = self.ticks_to_land(height)
+        return None if ticks is None else ticks * self.step_x
+
+
+DEFAULT_ARC = JumpArc()
+
+
+class PlatformGraph:
+    """Узлы - платформы раскладки по порядку и пол комнаты последним"""
+
+    def __init__(self, platforms, left, right, floor_y, arc=None):
+        self.arc = arc or DEFAULT_ARC
+        self.rects = [(x - width / 2, x + width / 2, y + height / 2) for x, y, width, height in platforms]
+        self.rects.append((left, right, floor_y))
+        self.floor = len(self.rects) - 1
+
+        # Выход - самая высокая платформа, без платформ выходом считается пол
+        self.exit = max(range(len(self.rects)), key=lambda i: self.rects[i][2])
+
+        self.edges = [[] for _ in self.rects]
+        self.build()
+        self.from_floor = self.reachable_from(self.floor)
+
+    def build(self):
+        rects = self.rects
+        arc = self.arc
+        half = PLAYER_SIZE / 2
+        reach_table = arc.reach_table
+        offset = arc.offset + LANDING_MARGIN  # Высоту округляем вверх - дальность не завышается
+
+        # Кандидаты только в окне высот прыжка: по отсортированным верхам
+        order = sorted(range(len(rects)), key=lambda i: rects[i][2])
+        tops = [rects[i][2] for i in order]
+
+        for a, (a_left, a_right, a_top) in enumerate(rects):
+            first = bisect_left(tops, a_top - arc.max_rise)
+            last = bisect_right(tops, a_top + arc.max_rise - LANDING_MARGIN)
+            edges = self.edges[a]
+            for b in order[first:last]:
+                if b == a:
+                    continue
+                b_left, b_right, b_top = rects[b]
+                height = b_top - a_top
+
+                # Платформа накрывает всю опору - над головой везде её низ
+                if height > PLAYER_SIZE and b_left <= a_left - half and b_right >= a_right + half:
+                    continue
+
+                if b_left > a_right:
+                    gap = b_left - a_right
+                elif a_left > b_right:
+                    gap = a_left - b_right
+                else:
+                    gap = 0
+                if gap <= reach_table[math.ceil(height) + offset]:
+                    edges.append(b)
+
+    def reachable_from(self, start):
+        """Множество узлов, куда можно попасть из start"""
+        seen = {start}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for neighbour in self.edges[node]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+        return seen
+
+    def exit_reachable(self):
+        """Достижима ли верхняя платформа с пола (посчитано при построении)"""
+        return self.exit in self.from_floor
+
+    def path(self, start, goal):
+        """Кратчайший по числу прыжков путь [start, ..., goal] или None"""
+        if start == goal:
+            return [start]
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for neighbour in self.edges[node]:
+                if neighbour in parents:
+                    continue
+                parents[neighbour] = node
+                if neighbour == goal:
+                    path = [goal]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    return path[::-1]
+                queue.append(neighbour)
+        return None
+
+    def node_at(self, x, feet, tolerance=6):
+        """Узел, на котором стоит игрок с центром x и ногами на высоте feet"""
+        for node, (left, right, top) in enumerate(self.rects):
+            if left <= x <= right and -tolerance < feet - top < tolerance:
+                return node
+        return None
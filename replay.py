@@ -0,0 +1,77 @@
+"""Запись ввода по тикам симуляции и повтор записи.
+
+Симуляция идёт шагами FIXED_STEP, а комнаты с врагами строятся только
+из level_seed, поэтому seed и нажатия клавиш с номерами тиков целиком
+задают прохождение. В конце записи сохраняется позиция игрока: повтор
+сверяет её и так ловит расхождение симуляции.
+
+    recorder = InputRecorder("run.eovr")
+    recorder.record(tick, arcade.key.D, True)
+    recorder.save(seed, array_engine, end_tick, player.position)
+
+    replay = Replay.load("run.eovr")
+    replay.events_until(tick)       # [(тик, клавиша, нажата), ...]
+"""
+import struct
+from bisect import bisect_left
+
+REPLAY_MAGIC = b"EOVR"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sHQ?IIdd")  # магия, версия, seed, массивы, тиков, событий, x и y игрока
+EVENT_RECORD = struct.Struct("<II?")  # тик, клавиша, нажата
+
+
+class InputRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+
+    def record(self, tick, key, pressed):
+        self.events.append((tick, key, pressed))
+
+    def truncate(self, tick):
+        """Забывает нажатия с тика tick и позже (перемотка назад)"""
+        self.events = [event for event in self.events if event[0] < tick]
+
+    def save(self, seed, array_engine, end_tick, position):
+        with open(self.path, "wb") as f:
+            f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, seed, array_engine,
+                                       end_tick, len(self.events), *position))
+            f.write(b"".join(EVENT_RECORD.pack(*event) for event in self.events))
+
+
+class Replay:
+    def __init__(self, seed, array_engine, end_tick, position, events):
+        self.seed = seed
+        self.array_engine = array_engine
+        self.end_tick = end_tick
+        self.position = position  # Где игрок был в конце записи
+        self.events = events
+        self.cursor = 0  # Сколько событий уже отдано
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+
+        magic, version, seed, array_engine, end_tick, count, x, y = REPLAY_HEADER.unpack_from(data, 0)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path}: не запись ввода (версия {REPLAY_VERSION})")
+        offset = REPLAY_HEADER.size
+        events = list(EVENT_RECORD.iter_unpack(data[offset:offset + count * EVENT_RECORD.size]))
+        return cls(seed, array_engine, end_tick, (x, y), events)
+
+    def events_until(self, tick):
+        """События с тиком не позже tick, которые ещё не отданы"""
+        start = self.cursor
+        while self.cursor < len(self.events) and self.events[self.cursor][0] <= tick:
+            self.cursor += 1
+        return self.events[start:self.cursor]
+
+    def seek(self, tick):
+        """Следующими будут отданы события с тика tick (перемотка)"""
+        self.cursor = bisect_left(self.events, (tick,))
+
+    def matches(self, tick, position):
+        """Дошли ли до того же тика и той же позиции игрока, что в записи"""
+        return tick == self.end_tick and tuple(position) == self.position
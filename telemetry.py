@@ -0,0 +1,85 @@
+"""Запись телеметрии кадров в файл для разбора после сессии.
+
+    writer = TelemetryWriter("session.jsonl")   # или session.csv
+    writer.write({"frame": 1, "frame_ms": 16.7, ...})
+    writer.close()
+
+Записи копятся в памяти и сбрасываются в файл пачками по buffer_size,
+чтобы запись на диск не попадала в замеры каждого кадра. Сборки мусора
+отслеживаются через gc.callbacks и попадают в ближайшую запись.
+"""
+import csv
+import gc
+import io
+import json
+import time
+
+CSV_FIELDS = ("frame", "time", "frame_ms", "update_ms", "draw_ms", "room",
+              "enemies", "bullets", "rooms", "gc_count", "gc_ms")
+
+
+class TelemetryWriter:
+    def __init__(self, path, buffer_size=600):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.as_csv = path.endswith(".csv")
+        self.buffer = []
+        self.gc_events = []  # (поколение, мс, собрано) с прошлой записи
+        self.gc_start = None
+
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        if self.as_csv:
+            self.file.write(",".join(CSV_FIELDS) + "\n")
+        gc.callbacks.append(self.on_gc)
+
+    def on_gc(self, phase, info):
+        if phase == "start":
+            self.gc_start = time.perf_counter()
+        elif self.gc_start is not None:
+            seconds = time.perf_counter() - self.gc_start
+            self.gc_events.append((info["generation"], round(seconds * 1000, 3), info["collected"]))
+            self.gc_start = None
+
+    def write(self, record):
+        """Добавляет запись кадра, события GC с прошлой записи дописываются в неё"""
+        record["gc"] = self.gc_events
+        self.gc_events = []
+        self.buffer.append(record)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.as_csv:
+            out = io.StringIO()
+            writer = csv.writer(out, lineterminator="\n")
+            for record in self.buffer:
+                writer.writerow(self.csv_row(record))
+            self.file.write(out.getvalue())
+        else:
+            self.file.write("".join(json.dumps(record, separators=(",", ":")) + "\n"
+                                    for record in self.buffer))
+        self.file.flush()
+        self.buffer = []
+
+    @staticmethod
+    def csv_row(record):
+        """Плоская строка CSV: комнаты как "индекс:враги:пули" через пробел"""
+        rooms = record.get("rooms", {})
+        gc_events = record["gc"]
+        row = dict(record)
+        row["enemies"] = sum(enemies for enemies, _ in rooms.values())
+        row["bullets"] = sum(bullets for _, bullets in rooms.values())
+        row["rooms"] = " ".join(f"{i}:{enemies}:{bullets}" for i, (enemies, bullets) in rooms.items())
+        row["gc_count"] = len(gc_events)
+        row["gc_ms"] = round(sum(ms for _, ms, _ in gc_events), 3)
+        return ["" if row.get(field) is None else row[field] for field in CSV_FIELDS]
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+        self.flush()
+        self.file.close()